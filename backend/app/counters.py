@@ -0,0 +1,146 @@
+import os
+import asyncio
+import logging
+import threading
+from sqlalchemy import update, case, bindparam
+
+from . import db
+from .models import UserCriterion
+
+logger = logging.getLogger(__name__)
+
+
+class CounterBuffer:
+    """
+    Write-behind buffer for count_value deltas of countable criteria.
+
+    Deltas are collected in memory keyed by (user_id, criterion_id, session_id)
+    and written to user_criteria with one batched UPDATE every
+    flush_interval_ms milliseconds, as soon as max_ops operations are
+    pending, and on shutdown.
+
+    Every flush bumps a generation counter before it starts and again after
+    it has committed, so the generation is odd while a flush is writing.
+    Readers go through read_merged(), which loads the stored counts again
+    whenever a flush overlapped the load; otherwise a count read just before
+    a flush committed would lose the flushed delta, and one read just after
+    it would count the delta twice.
+    """
+
+    def __init__(self, enabled: bool = False, flush_interval_ms: int = 500, max_ops: int = 1000):
+        self.enabled = enabled
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_ops = max_ops
+        self._pending = {}
+        self._ops = 0
+        self._generation = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def add(self, key: tuple, delta: int):
+        with self._lock:
+            self._pending[key] = self._pending.get(key, 0) + delta
+            self._ops += 1
+            full = self._ops >= self.max_ops
+        if full:
+            if self._thread is not None:
+                self._wakeup.set()
+            else:
+                self.flush()
+
+    async def read_merged(self, load, stored):
+        """
+        Await load() and return its result together with the stored counts
+        that stored(result) returns ({key: count_value}) with the pending
+        deltas applied. load() is repeated until no flush overlapped it, so
+        it must read fresh rows every time (populate_existing for ORM loads).
+        """
+        while True:
+            with self._lock:
+                generation = self._generation
+            if generation % 2:
+                # A flush is writing, its rows are visible once it is done
+                await asyncio.sleep(0.001)
+                continue
+            result = await load()
+            counts = stored(result)
+            with self._lock:
+                if self._generation == generation:
+                    return result, {
+                        key: max((count or 0) + self._pending.get(key, 0), 0) for key, count in counts.items()
+                    }
+
+    def flush(self) -> int:
+        """Write all pending deltas in one statement. Returns the number of rows."""
+        with self._flush_lock:
+            with self._lock:
+                pending = {key: delta for key, delta in self._pending.items() if delta}
+                self._pending = {}
+                self._ops = 0
+                if not pending:
+                    return 0
+                self._generation += 1
+
+            table = UserCriterion.__table__
+            new_count = table.c.count_value + bindparam("delta")
+            stmt = (
+                update(table)
+                .where(
+                    table.c.user_id == bindparam("u_id"),
+                    table.c.criterion_id == bindparam("c_id"),
+                    table.c.session_id == bindparam("s_id")
+                )
+                .values(count_value=case((new_count > 0, new_count), else_=0))
+            )
+            params = [
+                {"u_id": u, "c_id": c, "s_id": s, "delta": delta}
+                for (u, c, s), delta in pending.items()
+            ]
+            db_sess = db.SessionLocal()
+            try:
+                db_sess.execute(stmt, params)
+                db_sess.commit()
+            except Exception:
+                db_sess.rollback()
+                logger.exception("Failed to flush %s counter deltas, keeping them buffered", len(pending))
+                with self._lock:
+                    for key, delta in pending.items():
+                        self._pending[key] = self._pending.get(key, 0) + delta
+                    self._generation += 1
+                return 0
+            finally:
+                db_sess.close()
+            with self._lock:
+                self._generation += 1
+            return len(pending)
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def start(self):
+        if not self.enabled or self._thread is not None:
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="counter-buffer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._stopped.set()
+            self._wakeup.set()
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+
+counter_buffer = CounterBuffer(
+    enabled=os.getenv("COUNTER_WRITE_BEHIND", "false").lower() == "true",
+    flush_interval_ms=int(os.getenv("COUNTER_FLUSH_INTERVAL_MS", "500")),
+    max_ops=int(os.getenv("COUNTER_FLUSH_MAX_OPS", "1000")),
+)
@@ -1,6 +1,17 @@
 import os
+import time
+import asyncio
+import logging
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import Request, Response
 from dotenv import load_dotenv, find_dotenv
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.orm import sessionmaker, declarative_base
 
 if os.getenv("DOCKER_ENV", "false").lower() == "true":
@@ -10,20 +21,301 @@ else:
 
 load_dotenv(find_dotenv(env_file))
 
+logger = logging.getLogger(__name__)
+
+
+def masked_url(url: str) -> str:
+    """Return url with its password replaced by ***, for logging."""
+    return make_url(url).render_as_string(hide_password=True)
+
+
 DATABASE_URL = os.getenv("DATABASE_URL")
 if DATABASE_URL:
-    print("DATABASE_URL successfully loaded:", DATABASE_URL)
+    logger.info("DATABASE_URL successfully loaded: %s", masked_url(DATABASE_URL))
 else:
-    print("DATABASE_URL not found. Make sure .env exists and has the correct variable.")
+    logger.warning("DATABASE_URL not found. Make sure .env exists and has the correct variable.")
+
+
+# Async drivers for the sync URLs used by Alembic, scripts and background jobs
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+
+def async_database_url(url: str) -> str:
+    """Return url with its driver replaced by the matching async driver."""
+    url = make_url(url)
+    return url.set(drivername=ASYNC_DRIVERS.get(url.get_backend_name(), url.drivername)).render_as_string(
+        hide_password=False
+    )
+
+
+# --- Engine settings ---
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+# Server side statement timeout in milliseconds (PostgreSQL only, 0 = no timeout)
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "0"))
+# false, true (statements) or debug (statements and result rows)
+DB_ECHO = os.getenv("DB_ECHO", "false").lower()
+
+
+def echo_level(value: str):
+    return "debug" if value == "debug" else value == "true"
+
+
+def engine_options(url: str) -> dict:
+    """Keyword arguments for create_engine / create_async_engine of url."""
+    url = make_url(url)
+    options = {"echo": echo_level(DB_ECHO)}
+    if url.get_backend_name() == "sqlite":
+        return options
 
-engine = create_engine(DATABASE_URL, echo=True)
+    options.update(
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_pre_ping=DB_POOL_PRE_PING,
+        pool_recycle=DB_POOL_RECYCLE,
+    )
+    if DB_STATEMENT_TIMEOUT_MS and url.get_backend_name() == "postgresql":
+        if url.get_driver_name() == "asyncpg":
+            options["connect_args"] = {"server_settings": {"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)}}
+        else:
+            options["connect_args"] = {"options": f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"}
+    return options
+
+
+# Sync engine: Alembic migrations, scripts, exports, imports and background jobs
+engine = create_engine(DATABASE_URL, **engine_options(DATABASE_URL))
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
+
+# Async engine: request handlers of the routers
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or async_database_url(DATABASE_URL)
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **engine_options(ASYNC_DATABASE_URL))
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
 Base = declarative_base()
 
-# Add this function here
-def get_db():
+
+# --- Read replicas ---
+# Comma separated sync URLs; the async URLs are derived like ASYNC_DATABASE_URL
+DATABASE_REPLICA_URLS = [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+for index, url in enumerate(DATABASE_REPLICA_URLS):
+    logger.info("Read replica %s: %s", index, masked_url(url))
+# A healthy replica is checked again after this many seconds, a failed one retried after DB_REPLICA_RETRY_SECONDS
+DB_REPLICA_CHECK_SECONDS = float(os.getenv("DB_REPLICA_CHECK_SECONDS", "10"))
+DB_REPLICA_RETRY_SECONDS = float(os.getenv("DB_REPLICA_RETRY_SECONDS", "30"))
+# A health check taking longer than this counts as failed
+DB_REPLICA_CHECK_TIMEOUT_SECONDS = float(os.getenv("DB_REPLICA_CHECK_TIMEOUT_SECONDS", "2"))
+# Reads of a client stay on the primary for this long after it wrote
+DB_REPLICA_STICKY_SECONDS = int(os.getenv("DB_REPLICA_STICKY_SECONDS", "5"))
+PRIMARY_COOKIE = "db_primary_until"
+READ_METHODS = ("GET", "HEAD", "OPTIONS")
+
+
+class ReplicaSet:
+    """
+    Round-robin over read replica engines. Each replica is health checked
+    with SELECT 1 at most every check_interval seconds; a replica that
+    failed is skipped for retry_interval seconds. A check that takes longer
+    than check_timeout seconds counts as failed, and only one check per
+    replica runs at a time: other requests keep using the last result
+    meanwhile. pick() returns None when no replica is healthy, so that reads
+    fall back to the primary.
+    """
+
+    def __init__(self, engines, check_interval: float, retry_interval: float, check_timeout: float):
+        self.engines = list(engines)
+        self.check_interval = check_interval
+        self.retry_interval = retry_interval
+        self.check_timeout = check_timeout
+        self._checked = {}
+        self._checking = set()
+        self._lock = threading.Lock()
+        # Threads only start on the first sync check
+        self._executor = ThreadPoolExecutor(max_workers=max(len(self.engines), 1), thread_name_prefix="replica-check")
+        self._counter = itertools.count()
+
+    def _order(self):
+        start = next(self._counter)
+        return [(start + i) % len(self.engines) for i in range(len(self.engines))]
+
+    def _status(self, index: int):
+        """True / False from a recent check, None when a check is due."""
+        healthy, checked_at = self._checked.get(index, (None, 0.0))
+        age = time.monotonic() - checked_at
+        if healthy and age < self.check_interval:
+            return True
+        if healthy is False and age < self.retry_interval:
+            return False
+        return None
+
+    def _record(self, index: int, healthy: bool):
+        was_healthy = self._checked.get(index, (True, 0.0))[0]
+        if was_healthy and not healthy:
+            logger.warning("Read replica %s failed its health check, reading from the primary", index)
+        elif was_healthy is False and healthy:
+            logger.info("Read replica %s is healthy again", index)
+        self._checked[index] = (healthy, time.monotonic())
+
+    def _claim(self, index: int) -> bool:
+        """Claim the health check of a replica; False if one is already running."""
+        with self._lock:
+            if index in self._checking:
+                return False
+            self._checking.add(index)
+            return True
+
+    def _last_result(self, index: int) -> bool:
+        return bool(self._checked.get(index, (False, 0.0))[0])
+
+    def _ping(self, index: int):
+        with self.engines[index].connect() as conn:
+            conn.execute(text("SELECT 1"))
+
+    async def _ping_async(self, index: int):
+        async with self.engines[index].connect() as conn:
+            await conn.execute(text("SELECT 1"))
+
+    def _check(self, index: int) -> bool:
+        if not self._claim(index):
+            return self._last_result(index)
+        try:
+            try:
+                # A hanging replica keeps a worker thread, but not the request
+                self._executor.submit(self._ping, index).result(timeout=self.check_timeout)
+                healthy = True
+            except Exception:
+                healthy = False
+            self._record(index, healthy)
+        finally:
+            self._checking.discard(index)
+        return healthy
+
+    async def _check_async(self, index: int) -> bool:
+        if not self._claim(index):
+            return self._last_result(index)
+        try:
+            try:
+                await asyncio.wait_for(self._ping_async(index), self.check_timeout)
+                healthy = True
+            except Exception:
+                healthy = False
+            self._record(index, healthy)
+        finally:
+            self._checking.discard(index)
+        return healthy
+
+    def pick(self):
+        for index in self._order():
+            healthy = self._status(index)
+            if healthy is None:
+                healthy = self._check(index)
+            if healthy:
+                return self.engines[index]
+        return None
+
+    async def pick_async(self):
+        for index in self._order():
+            healthy = self._status(index)
+            if healthy is None:
+                healthy = await self._check_async(index)
+            if healthy:
+                return self.engines[index]
+        return None
+
+
+replicas = ReplicaSet(
+    [create_engine(url, **engine_options(url)) for url in DATABASE_REPLICA_URLS],
+    DB_REPLICA_CHECK_SECONDS, DB_REPLICA_RETRY_SECONDS, DB_REPLICA_CHECK_TIMEOUT_SECONDS,
+)
+async_replicas = ReplicaSet(
+    [
+        create_async_engine(async_database_url(url), **engine_options(async_database_url(url)))
+        for url in DATABASE_REPLICA_URLS
+    ],
+    DB_REPLICA_CHECK_SECONDS, DB_REPLICA_RETRY_SECONDS, DB_REPLICA_CHECK_TIMEOUT_SECONDS,
+)
+
+
+def reads_from_primary(request: Request) -> bool:
+    """Read-your-writes: a client that wrote recently carries a cookie pinning its reads to the primary."""
+    try:
+        return float(request.cookies.get(PRIMARY_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+def pin_to_primary(request: Request, response: Response):
+    if DATABASE_REPLICA_URLS and request.method not in READ_METHODS:
+        response.set_cookie(
+            PRIMARY_COOKIE, str(time.time() + DB_REPLICA_STICKY_SECONDS),
+            max_age=DB_REPLICA_STICKY_SECONDS, httponly=True, samesite="lax"
+        )
+
+
+def dialect_insert(db, table):
+    """INSERT construct supporting ON CONFLICT for the database of db (sync or async session), or None."""
+    name = db.get_bind().dialect.name
+    if name == "postgresql":
+        return pg_insert(table)
+    if name == "sqlite":
+        return sqlite_insert(table)
+    return None
+
+
+async def dispose_async_engines():
+    await async_engine.dispose()
+    for replica in async_replicas.engines:
+        await replica.dispose()
+
+
+# --- Session providers, one session per request ---
+def get_db(request: Request, response: Response):
+    """Sync session for endpoints that stream or hand work to threads."""
+    pin_to_primary(request, response)
     db = SessionLocal()
     try:
         yield db
+    except Exception:
+        db.rollback()
+        raise
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+def get_read_db(request: Request):
+    """Sync session on a read replica, or on the primary if none is usable."""
+    replica = None if reads_from_primary(request) else replicas.pick()
+    db = SessionLocal(bind=replica) if replica is not None else SessionLocal()
+    try:
+        yield db
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+async def get_async_db(request: Request, response: Response):
+    """Async session for the request handlers."""
+    pin_to_primary(request, response)
+    async with AsyncSessionLocal() as db:
+        try:
+            yield db
+        except Exception:
+            await db.rollback()
+            raise
+
+
+async def get_async_read_db(request: Request):
+    """Async session for read-only handlers on a read replica, or on the primary if none is usable."""
+    replica = None if reads_from_primary(request) else await async_replicas.pick_async()
+    async with (AsyncSessionLocal(bind=replica) if replica is not None else AsyncSessionLocal()) as db:
+        try:
+            yield db
+        except Exception:
+            await db.rollback()
+            raise
@@ -0,0 +1,150 @@
+import os
+import hashlib
+import logging
+import tempfile
+import threading
+from typing import Optional
+from sqlalchemy import select, func, case, cast, String
+from sqlalchemy.orm import Session
+
+from . import models
+
+logger = logging.getLogger(__name__)
+
+
+def content_digest(dialect_name: str, *columns):
+    """
+    Aggregate over the full content of a small table, for tables without
+    updated_at. PostgreSQL reduces it to an md5; other databases return the
+    concatenated rows.
+    """
+    row = cast(columns[0], String)
+    for column in columns[1:]:
+        row = row + "|" + func.coalesce(cast(column, String), "")
+    rows = select(row.label("row")).order_by(*columns).subquery()
+    content = func.aggregate_strings(rows.c.row, ";")
+    if dialect_name == "postgresql":
+        content = func.md5(content)
+    return select(content).scalar_subquery()
+
+
+def fingerprint_columns(dialect_name: str):
+    """
+    Cheap aggregates per exported table that change whenever its rows do:
+    row count and max id catch inserts and deletes, max(updated_at) catches
+    updates. Teams and SessionCriteria have no updated_at and are small, so
+    their whole content is fingerprinted.
+    """
+    def aggregates(model, *exprs):
+        return [
+            select(expr).select_from(model).scalar_subquery()
+            for expr in (func.count(), *exprs)
+        ]
+
+    return [
+        *aggregates(models.User, func.max(models.User.id), func.max(models.User.updated_at)),
+        *aggregates(models.Team),
+        content_digest(dialect_name, models.Team.id, models.Team.name),
+        *aggregates(models.Role, func.max(models.Role.id), func.max(models.Role.updated_at)),
+        *aggregates(models.Criterion, func.max(models.Criterion.id), func.max(models.Criterion.updated_at)),
+        *aggregates(models.Session, func.max(models.Session.id), func.max(models.Session.updated_at)),
+        *aggregates(models.SessionCriterion),
+        content_digest(
+            dialect_name,
+            models.SessionCriterion.session_id,
+            models.SessionCriterion.criterion_id,
+            models.SessionCriterion.role_id,
+            models.SessionCriterion.weight
+        ),
+        *aggregates(
+            models.UserSessionRole, func.max(models.UserSessionRole.id), func.max(models.UserSessionRole.updated_at)
+        ),
+        *aggregates(
+            models.UserSessionComment,
+            func.max(models.UserSessionComment.id), func.max(models.UserSessionComment.updated_at)
+        ),
+        *aggregates(
+            models.UserCriterionText,
+            func.max(models.UserCriterionText.id),
+            func.sum(case((models.UserCriterionText.is_active.is_(True), models.UserCriterionText.id), else_=0))
+        ),
+        *aggregates(models.UserCriterion, func.max(models.UserCriterion.id), func.max(models.UserCriterion.updated_at)),
+    ]
+
+
+def data_version(db: Session) -> str:
+    """Fingerprint of all exported tables, computed with one query."""
+    row = db.execute(select(*fingerprint_columns(db.get_bind().dialect.name))).one()
+    return hashlib.sha256(repr(tuple(row)).encode()).hexdigest()[:32]
+
+
+class ExportCache:
+    """
+    Generated export files on disk, keyed by format and data version.
+    Least recently used files are evicted once the directory grows beyond
+    max_bytes. A max_bytes of 0 disables the cache.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, key)
+
+    def open(self, key: str):
+        """
+        Open a cached file for reading, or return None. The open handle
+        stays readable even if the file is evicted while it is served.
+        """
+        path = self.path(key)
+        try:
+            fh = open(path, "rb")
+        except OSError:
+            return None
+        try:
+            os.utime(fh.fileno())
+        except OSError:
+            pass
+        return fh
+
+    def new_file(self):
+        """Open a temp file in the cache directory to write an export into."""
+        os.makedirs(self.directory, exist_ok=True)
+        return tempfile.NamedTemporaryFile(dir=self.directory, prefix=".tmp-", delete=False)
+
+    def put(self, key: str, tmp_path: str):
+        """Move a written temp file into the cache and return it opened for reading."""
+        path = self.path(key)
+        fh = open(tmp_path, "rb")
+        os.replace(tmp_path, path)
+        self.evict(keep=path)
+        return fh
+
+    def evict(self, keep: Optional[str] = None):
+        with self._lock:
+            files = []
+            for entry in os.scandir(self.directory):
+                if entry.is_file() and not entry.name.startswith(".tmp-") and entry.path != keep:
+                    stat = entry.stat()
+                    files.append((stat.st_mtime, stat.st_size, entry.path))
+            total = sum(size for _, size, _ in files) + (os.path.getsize(keep) if keep else 0)
+            for _, size, path in sorted(files):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                except OSError:
+                    logger.warning("Could not evict cached export %s", path)
+
+
+export_cache = ExportCache(
+    directory=os.getenv("EXPORT_CACHE_DIR", os.path.join(tempfile.gettempdir(), "bewertungsapp-exports")),
+    max_bytes=int(os.getenv("EXPORT_CACHE_MAX_MB", "512")) * 1024 * 1024,
+)
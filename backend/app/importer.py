@@ -0,0 +1,681 @@
+import os
+import pickle
+import logging
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from enum import Enum
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterator, List, Optional
+
+import openpyxl
+import pandas as pd
+from sqlalchemy import select, update, insert, bindparam, text
+from sqlalchemy.orm import Session
+
+from . import models
+from .db import dialect_insert
+from .security import hash_password
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PASSWORD = "test"
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", "5000"))
+SAMPLE_SIZE = 5
+# Workbooks of at least PARALLEL_PARSE_MIN_BYTES (5 MB) are parsed in one process per sheet, up to
+# one per CPU core; smaller ones are parsed in the importing thread, since starting worker processes
+# costs more than it saves. Every worker loads the workbook's whole shared strings table, so
+# IMPORT_PARSE_WORKERS caps the worker count on memory-constrained hosts (0 = no cap, 1 = no workers).
+IMPORT_PARSE_WORKERS = int(os.getenv("IMPORT_PARSE_WORKERS", "0"))
+PARALLEL_PARSE_MIN_BYTES = 5 * 1024 * 1024
+
+
+# -------------------------
+# Helpers
+# -------------------------
+def to_timestamp(series: pd.Series, default: datetime) -> pd.Series:
+    """Parse ISO timestamps of a sheet (UTC if they have no offset); missing or invalid ones become default."""
+    return pd.to_datetime(series, utc=True, errors="coerce", format="ISO8601").fillna(default)
+
+
+def stored_value(value):
+    """A value read from the database as it compares to the parsed sheet values."""
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, datetime) and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def to_int(series: pd.Series) -> pd.Series:
+    return pd.to_numeric(series, errors="coerce").astype("Int64")
+
+
+def column(df: pd.DataFrame, name: str, default=None) -> pd.Series:
+    """Return a column of the sheet, or a column filled with default if it is missing."""
+    if name in df.columns:
+        return df[name]
+    return pd.Series([default] * len(df), index=df.index, dtype=object)
+
+
+def records(df: pd.DataFrame, columns: List[str]) -> List[dict]:
+    """Convert DataFrame rows to dicts of plain Python values (NaN/NA -> None)."""
+    data = df[columns].astype(object)
+    return data.where(data.notna(), None).to_dict("records")
+
+
+def map_ids(series: pd.Series, id_map: pd.Series) -> pd.Series:
+    """Translate old ids from the workbook into database ids."""
+    return to_int(series).map(id_map).astype("Int64")
+
+
+def require_mapped(sheet: str, df: pd.DataFrame, columns: List[str]):
+    for col in columns:
+        missing = df[col].isna()
+        if missing.any():
+            raise ValueError(f"{sheet}: {int(missing.sum())} rows reference an unknown {col}")
+
+
+# -------------------------
+# Import context
+# -------------------------
+class ImportContext:
+    """
+    Shared state of one import: the database session, the old -> new id map
+    of every imported sheet and the key sets fetched from the database,
+    which are fetched once per table and kept in sync with written rows.
+    progress is called with (sheet, stats) whenever the counts of a sheet change.
+    With dry_run nothing is written; rows are only classified and sampled.
+    """
+
+    def __init__(self, db: Session, progress: Optional[Callable[[str, dict], None]] = None,
+                 dry_run: bool = False):
+        self.db = db
+        self.progress = progress
+        self.dry_run = dry_run
+        self.id_maps: Dict[str, pd.Series] = {}
+        self.deferred: Dict[str, pd.DataFrame] = {}
+        self.stats: Dict[str, Dict[str, int]] = {}
+        self.samples: Dict[str, Dict[str, List[dict]]] = {}
+        self._existing: Dict[str, pd.DataFrame] = {}
+        self._placeholder_id = 0
+
+    def id_map(self, sheet: str) -> pd.Series:
+        return self.id_maps.get(sheet, pd.Series(dtype="Int64"))
+
+    def add_ids(self, sheet: str, old_ids: pd.Series, new_ids: pd.Series):
+        mapping = pd.Series(new_ids.astype("Int64").values, index=to_int(old_ids).values)
+        current = self.id_maps.get(sheet)
+        self.id_maps[sheet] = mapping if current is None else pd.concat([current, mapping])
+
+    def placeholder_ids(self, n: int) -> pd.Series:
+        """Negative ids standing in for rows a dry run would insert."""
+        ids = pd.Series(range(self._placeholder_id - 1, self._placeholder_id - 1 - n, -1), dtype="Int64")
+        self._placeholder_id -= n
+        return ids
+
+    def count(self, sheet: str, rows: int = 0, inserted: int = 0, updated: int = 0,
+              unchanged: int = 0, upserted: int = 0):
+        """Count processed and written rows; upserted rows were written with ON CONFLICT and may be either."""
+        stats = self.stats.setdefault(
+            sheet, {"rows": 0, "inserted": 0, "updated": 0, "unchanged": 0, "upserted": 0}
+        )
+        stats["rows"] += rows
+        stats["inserted"] += inserted
+        stats["updated"] += updated
+        stats["unchanged"] += unchanged
+        stats["upserted"] += upserted
+        if self.progress is not None:
+            self.progress(sheet, self.snapshot(sheet))
+
+    def sample(self, sheet: str, kind: str, df: pd.DataFrame, columns: List[str]):
+        """Keep the first SAMPLE_SIZE rows of each kind of change (dry run only)."""
+        if not self.dry_run:
+            return
+        samples = self.samples.setdefault(sheet, {"insert": [], "update": [], "unchanged": []})[kind]
+        missing = SAMPLE_SIZE - len(samples)
+        if missing > 0 and not df.empty:
+            columns = [c for c in dict.fromkeys(columns) if c in df.columns]
+            samples.extend(records(df.head(missing), columns))
+
+    def snapshot(self, sheet: str) -> dict:
+        stats = dict(self.stats.get(sheet, {}))
+        if self.dry_run:
+            stats["samples"] = {
+                kind: list(rows) for kind, rows in self.samples.get(sheet, {}).items()
+            }
+        return stats
+
+    def existing(self, model, columns: List[str]) -> pd.DataFrame:
+        """
+        DataFrame of db_id (if the table has an id) and the given columns for
+        all rows of a table, fetched once per table.
+        """
+        table = model.__tablename__
+        columns = [c for c in columns if c != "id"]
+        cached = self._existing.get(table)
+        if cached is None or not set(columns) <= set(cached.columns):
+            cols = ([model.id.label("db_id")] if hasattr(model, "id") else []) + [
+                getattr(model, c) for c in columns
+            ]
+            rows = self.db.execute(select(*cols)).all()
+            frame = pd.DataFrame(rows, columns=[c.key for c in cols])
+            for c in frame.columns:
+                if c == "db_id" or c.endswith("_id"):
+                    frame[c] = frame[c].astype("Int64")
+                else:
+                    frame[c] = frame[c].map(stored_value)
+            self._existing[table] = frame
+        return self._existing[table]
+
+    def add_existing(self, model, frame: pd.DataFrame):
+        table = model.__tablename__
+        self._existing[table] = pd.concat([self._existing[table], frame], ignore_index=True)
+
+    def update_existing(self, model, frame: pd.DataFrame):
+        """Replace cached rows by db_id after they were updated."""
+        if frame.empty:
+            return
+        table = model.__tablename__
+        cached = self._existing[table]
+        self._existing[table] = pd.concat(
+            [cached[~cached["db_id"].isin(frame["db_id"])], frame], ignore_index=True
+        )
+
+
+# -------------------------
+# Bulk writers
+# -------------------------
+def bulk_update(db: Session, model, df: pd.DataFrame, columns: List[str], id_col: str = "db_id"):
+    """UPDATE many rows by primary key with one executemany statement."""
+    if df.empty or not columns:
+        return
+    table = model.__table__
+    stmt = (
+        update(table)
+        .where(table.c.id == bindparam("p_id"))
+        .values({c: bindparam(f"p_{c}") for c in columns})
+    )
+    params = records(df.rename(columns={id_col: "p_id", **{c: f"p_{c}" for c in columns}}),
+                     ["p_id"] + [f"p_{c}" for c in columns])
+    db.execute(stmt, params)
+
+
+def bulk_insert(db: Session, model, rows: List[dict], returning: bool = False) -> Optional[List[int]]:
+    """INSERT many rows with one batched statement, optionally returning the new ids in order."""
+    if not rows:
+        return [] if returning else None
+    if returning:
+        stmt = insert(model).returning(model.id, sort_by_parameter_order=True)
+        return list(db.scalars(stmt, rows).all())
+    db.execute(insert(model), rows)
+    return None
+
+
+def bulk_upsert(db: Session, model, rows: List[dict], conflict_cols: List[str], update_cols: List[str]):
+    """
+    INSERT ... ON CONFLICT DO UPDATE for many rows. Falls back to a key
+    prefetch plus separate UPDATE/INSERT on other databases.
+    """
+    if not rows:
+        return
+    table = model.__table__
+    stmt = dialect_insert(db, table)
+    if stmt is not None:
+        set_ = {c: stmt.excluded[c] for c in update_cols}
+        db.execute(stmt.on_conflict_do_update(index_elements=conflict_cols, set_=set_), rows)
+        return
+
+    existing = {
+        tuple(row) for row in db.execute(select(*[table.c[c] for c in conflict_cols])).all()
+    }
+    to_update = [r for r in rows if tuple(r[c] for c in conflict_cols) in existing]
+    to_insert = [r for r in rows if tuple(r[c] for c in conflict_cols) not in existing]
+    if to_update:
+        stmt = (
+            update(table)
+            .where(*[table.c[c] == bindparam(f"k_{c}") for c in conflict_cols])
+            .values({c: bindparam(f"p_{c}") for c in update_cols})
+        )
+        db.execute(stmt, [
+            {**{f"k_{c}": r[c] for c in conflict_cols}, **{f"p_{c}": r[c] for c in update_cols}}
+            for r in to_update
+        ])
+    if to_insert:
+        db.execute(insert(table), to_insert)
+
+
+def changed_rows(merged: pd.DataFrame, columns: List[str]) -> pd.Series:
+    """Rows where any column differs from its stored counterpart <column>_db."""
+    changed = pd.Series(False, index=merged.index)
+    for c in columns:
+        new, old = merged[c].astype(object), merged[f"{c}_db"].astype(object)
+        same = (new == old) | (new.isna() & old.isna())
+        changed |= ~same.fillna(False).astype(bool)
+    return changed
+
+
+def upsert_by_key(ctx: ImportContext, sheet: str, model, df: pd.DataFrame, key: List[str],
+                  update_cols: List[str], insert_cols: List[str], keep_ids: bool = True):
+    """
+    Match sheet rows against the database by a natural key with one merge,
+    update the rows whose values changed and insert the rest in bulk. Sheet
+    rows with the same key as an earlier row map to the same database row.
+    Records the old -> new id mapping of the sheet.
+    """
+    if df.empty:
+        return
+    existing = ctx.existing(model, key + update_cols)
+    merged = df.merge(
+        existing[["db_id"] + key + update_cols].rename(columns={c: f"{c}_db" for c in update_cols}),
+        on=key, how="left"
+    )
+
+    found = merged[merged["db_id"].notna()]
+    changed = changed_rows(found, update_cols)
+    to_update = found[changed].drop_duplicates("db_id", keep="last")
+    if not ctx.dry_run:
+        bulk_update(ctx.db, model, to_update, update_cols)
+    ctx.update_existing(model, to_update[["db_id"] + key + update_cols])
+
+    new = merged[merged["db_id"].isna()].drop(columns="db_id")
+    first = new.drop_duplicates(key)
+    if keep_ids:
+        ids = to_int(first["id"])
+        if not ctx.dry_run:
+            bulk_insert(ctx.db, model, records(first.assign(id=ids), ["id"] + insert_cols))
+    elif ctx.dry_run:
+        ids = ctx.placeholder_ids(len(first))
+    else:
+        ids = pd.Series(bulk_insert(ctx.db, model, records(first, insert_cols), returning=True), dtype="Int64")
+    inserted = first[key + update_cols].assign(db_id=ids.values)
+    ctx.add_existing(model, inserted)
+    new = new.merge(inserted[key + ["db_id"]], on=key, how="left")
+
+    if "id" in df.columns:
+        ctx.add_ids(sheet, found["id"], found["db_id"])
+        ctx.add_ids(sheet, new["id"], new["db_id"])
+    sample_cols = ["id", "db_id"] + key + insert_cols
+    ctx.sample(sheet, "insert", first, sample_cols)
+    ctx.sample(sheet, "update", found[changed], sample_cols)
+    ctx.sample(sheet, "unchanged", found[~changed], sample_cols)
+    ctx.count(sheet, inserted=len(first), updated=int(changed.sum()), unchanged=int((~changed).sum()))
+
+
+def upsert_rows(ctx: ImportContext, sheet: str, model, df: pd.DataFrame,
+                conflict_cols: List[str], update_cols: List[str]):
+    """
+    Write rows keyed by a primary key with INSERT ... ON CONFLICT DO UPDATE.
+    A dry run instead compares them with the stored rows in one merge.
+    """
+    df = df.drop_duplicates(conflict_cols, keep="last")
+    if df.empty:
+        return
+    if not ctx.dry_run:
+        bulk_upsert(ctx.db, model, records(df, conflict_cols + update_cols), conflict_cols, update_cols)
+        ctx.count(sheet, upserted=len(df))
+        return
+
+    existing = ctx.existing(model, conflict_cols + update_cols)
+    if "id" in conflict_cols:
+        existing = existing.rename(columns={"db_id": "id"})
+    merged = df.merge(
+        existing[conflict_cols + update_cols].rename(columns={c: f"{c}_db" for c in update_cols}),
+        on=conflict_cols, how="left", indicator=True
+    )
+    found = merged[merged["_merge"] == "both"]
+    new = merged[merged["_merge"] == "left_only"]
+    changed = changed_rows(found, update_cols)
+
+    added = new[conflict_cols + update_cols]
+    ctx.add_existing(model, added.rename(columns={"id": "db_id"}) if "id" in conflict_cols else added)
+    sample_cols = conflict_cols + update_cols
+    ctx.sample(sheet, "insert", new, sample_cols)
+    ctx.sample(sheet, "update", found[changed], sample_cols)
+    ctx.sample(sheet, "unchanged", found[~changed], sample_cols)
+    ctx.count(sheet, inserted=len(new), updated=int(changed.sum()), unchanged=int((~changed).sum()))
+
+
+# -------------------------
+# Sheet importers
+# -------------------------
+USER_CRITERION_KEY = ["user_id", "criterion_id", "session_id"]
+
+
+def import_teams(ctx: ImportContext, df: pd.DataFrame):
+    df = df.assign(name=df["name"].astype(str))
+    upsert_by_key(ctx, "Teams", models.Team, df, ["name"], [], ["name"])
+
+
+def import_roles(ctx: ImportContext, df: pd.DataFrame):
+    df = df.assign(name=df["name"].astype(str), description=column(df, "description"))
+    upsert_by_key(ctx, "Roles", models.Role, df, ["name"], ["description"], ["name", "description"])
+
+
+def import_users(ctx: ImportContext, df: pd.DataFrame):
+    df = df.assign(
+        email=df["email"].astype(str),
+        team_id=map_ids(column(df, "team_id"), ctx.id_map("Teams"))
+    )
+    password_hash = column(df, "password_hash")
+    if password_hash.isna().any():
+        # One hash for all users without one instead of one bcrypt round per row
+        password_hash = password_hash.fillna(hash_password(DEFAULT_PASSWORD))
+    df = df.assign(password_hash=password_hash)
+    upsert_by_key(
+        ctx, "Users", models.User, df, ["email"],
+        ["first_name", "last_name", "team_id"],
+        ["first_name", "last_name", "email", "password_hash", "team_id"]
+    )
+
+
+def import_criteria(ctx: ImportContext, df: pd.DataFrame):
+    df = df.assign(name=df["name"].astype(str), type=df["type"].astype(str))
+    upsert_by_key(ctx, "Criteria", models.Criterion, df, ["name", "type"], [], ["name", "type"])
+
+
+def import_sessions(ctx: ImportContext, df: pd.DataFrame):
+    """
+    Sessions are imported level by level so parents are mapped before their
+    children. Rows whose parent has not been imported yet are deferred until
+    a later chunk or finish_sessions.
+    """
+    rows = df.assign(
+        title=df["title"].astype(str),
+        parent_old=to_int(column(df, "parent_id")),
+        description=column(df, "description")
+    )
+    pending = ctx.deferred.pop("Sessions", None)
+    if pending is not None:
+        rows = pd.concat([pending, rows], ignore_index=True)
+    remaining = import_session_levels(ctx, rows)
+    if not remaining.empty:
+        ctx.deferred["Sessions"] = remaining
+
+
+def finish_sessions(ctx: ImportContext):
+    """Import deferred sessions; parents that are not part of the workbook become top-level sessions."""
+    remaining = ctx.deferred.pop("Sessions", None)
+    while remaining is not None and not remaining.empty:
+        remaining = import_session_levels(ctx, remaining, orphans=True)
+
+
+def import_session_levels(ctx: ImportContext, remaining: pd.DataFrame, orphans: bool = False) -> pd.DataFrame:
+    """Import every row whose parent is known, level by level. Returns the rows left over."""
+    while not remaining.empty:
+        id_map = ctx.id_map("Sessions")
+        ready = remaining["parent_old"].isna() | remaining["parent_old"].isin(id_map.index)
+        if not ready.any():
+            if not orphans:
+                break
+            ready[:] = True
+        level = remaining[ready]
+        remaining = remaining[~ready]
+        level = level.assign(parent_id=map_ids(level["parent_old"], id_map))
+        upsert_by_key(
+            ctx, "Sessions", models.Session, level, ["title", "parent_id"],
+            ["description"], ["title", "description", "parent_id"]
+        )
+    return remaining
+
+
+def import_session_criteria(ctx: ImportContext, df: pd.DataFrame):
+    df = df.assign(
+        session_id=map_ids(df["session_id"], ctx.id_map("Sessions")),
+        criterion_id=map_ids(df["criterion_id"], ctx.id_map("Criteria")),
+        role_id=map_ids(column(df, "role_id"), ctx.id_map("Roles")),
+        weight=pd.to_numeric(column(df, "weight", 1.0), errors="coerce").fillna(1.0).astype(float)
+    )
+    require_mapped("SessionCriteria", df, ["session_id", "criterion_id", "role_id"])
+    upsert_rows(
+        ctx, "SessionCriteria", models.SessionCriterion, df,
+        ["session_id", "criterion_id", "role_id"], ["weight"]
+    )
+
+
+def import_user_criteria(ctx: ImportContext, df: pd.DataFrame):
+    df = df.assign(
+        user_id=map_ids(df["user_id"], ctx.id_map("Users")),
+        criterion_id=map_ids(df["criterion_id"], ctx.id_map("Criteria")),
+        session_id=map_ids(column(df, "session_id"), ctx.id_map("Sessions")),
+        count_value=pd.to_numeric(column(df, "count_value", 0), errors="coerce").fillna(0).astype(int),
+        is_fulfilled=column(df, "is_fulfilled", False).fillna(False).astype(bool)
+    )
+    require_mapped("UserCriteria", df, ["user_id", "criterion_id"])
+    upsert_by_key(
+        ctx, "UserCriteria", models.UserCriterion, df, USER_CRITERION_KEY,
+        ["count_value", "is_fulfilled"],
+        ["user_id", "criterion_id", "session_id", "count_value", "is_fulfilled"],
+        keep_ids=False
+    )
+
+
+def import_user_criterion_texts(ctx: ImportContext, df: pd.DataFrame):
+    uc_ref = to_int(df["user_criterion_id"])
+    uc_map = ctx.id_map("UserCriteria")
+    df = df.assign(
+        id=to_int(df["id"]),
+        user_criterion_id=uc_ref.map(uc_map).astype("Int64").fillna(uc_ref),
+        text_value=column(df, "text_value").fillna(""),
+        is_active=column(df, "is_active", True).fillna(True).astype(bool),
+        created_at=to_timestamp(column(df, "created_at"), datetime.now(timezone.utc))
+    )
+    # Skip texts whose user criterion does not exist
+    known = ctx.existing(models.UserCriterion, USER_CRITERION_KEY)["db_id"]
+    df = df[df["user_criterion_id"].isin(known)]
+    upsert_rows(
+        ctx, "UserCriterionTexts", models.UserCriterionText, df,
+        ["id"], ["user_criterion_id", "text_value", "is_active", "created_at"]
+    )
+
+
+def import_user_session_comments(ctx: ImportContext, df: pd.DataFrame):
+    now = datetime.now(timezone.utc)
+    df = df.assign(
+        id=to_int(df["id"]),
+        user_id=map_ids(df["user_id"], ctx.id_map("Users")),
+        session_id=map_ids(df["session_id"], ctx.id_map("Sessions")),
+        created_at=to_timestamp(column(df, "created_at"), now),
+        updated_at=to_timestamp(column(df, "updated_at"), now)
+    )
+    require_mapped("UserSessionComments", df, ["user_id", "session_id"])
+    upsert_rows(
+        ctx, "UserSessionComments", models.UserSessionComment, df,
+        ["id"], ["user_id", "session_id", "text", "created_at", "updated_at"]
+    )
+
+
+def import_user_session_roles(ctx: ImportContext, df: pd.DataFrame):
+    now = datetime.now(timezone.utc)
+    df = df.assign(
+        user_id=map_ids(df["user_id"], ctx.id_map("Users")),
+        session_id=map_ids(df["session_id"], ctx.id_map("Sessions")),
+        role_id=map_ids(df["role_id"], ctx.id_map("Roles")),
+        created_at=to_timestamp(column(df, "created_at"), now),
+        updated_at=to_timestamp(column(df, "updated_at"), now)
+    )
+    require_mapped("UserSessionRoles", df, ["user_id", "session_id", "role_id"])
+    upsert_by_key(
+        ctx, "UserSessionRoles", models.UserSessionRole, df, ["user_id", "session_id"],
+        ["role_id", "updated_at"], ["user_id", "session_id", "role_id", "created_at", "updated_at"]
+    )
+
+
+# Sheets in dependency order. UserCriteria come before their texts so that
+# text rows can be remapped to the imported user criteria.
+SHEET_IMPORTERS = [
+    ("Teams", import_teams),
+    ("Roles", import_roles),
+    ("Users", import_users),
+    ("Criteria", import_criteria),
+    ("Sessions", import_sessions),
+    ("SessionCriteria", import_session_criteria),
+    ("UserCriteria", import_user_criteria),
+    ("UserCriterionTexts", import_user_criterion_texts),
+    ("UserSessionComments", import_user_session_comments),
+    ("UserSessionRoles", import_user_session_roles),
+]
+
+# Called once after the last chunk of a sheet
+SHEET_FINISHERS = {
+    "Sessions": finish_sessions,
+}
+
+SEQUENCE_RESETS = [
+    ("users", "users_id_seq"),
+    ("teams", "teams_id_seq"),
+    ("roles", "roles_id_seq"),
+    ("criteria", "criteria_id_seq"),
+    ("sessions", "sessions_id_seq"),
+    ("user_criteria", "user_criteria_id_seq"),
+    ("user_criterion_texts", "user_criterion_texts_id_seq"),
+    ("user_session_comments", "user_session_comments_id_seq"),
+    ("user_session_roles", "user_session_roles_id_seq"),
+]
+
+
+def reset_sequences(db: Session):
+    """Ensure auto-increment sequences continue after the imported ids (PostgreSQL only)."""
+    if db.get_bind().dialect.name != "postgresql":
+        return
+    try:
+        for table, seq in SEQUENCE_RESETS:
+            db.execute(
+                text(f"SELECT setval('{seq}', (SELECT COALESCE(MAX(id), 0) + 1 FROM {table}), false)")
+            )
+        db.commit()
+    except Exception as seq_err:
+        db.rollback()
+        logger.warning("Failed to reset sequences — %s", seq_err)
+
+
+def iter_sheet_chunks(workbook, sheet: str, chunk_size: int = IMPORT_CHUNK_SIZE) -> Iterator[pd.DataFrame]:
+    """
+    Stream the rows of a read-only workbook sheet as DataFrames of at most
+    chunk_size rows, using the first row as header. Empty rows are skipped.
+    """
+    rows = workbook[sheet].iter_rows(values_only=True)
+    header = next(rows, None)
+    if header is None:
+        return
+    columns = [str(name) if name is not None else f"column_{i}" for i, name in enumerate(header)]
+    width = len(columns)
+    chunk = []
+    for row in rows:
+        if all(value is None for value in row):
+            continue
+        chunk.append(tuple(row[:width]) + (None,) * (width - len(row)))
+        if len(chunk) >= chunk_size:
+            yield pd.DataFrame(chunk, columns=columns)
+            chunk = []
+    if chunk:
+        yield pd.DataFrame(chunk, columns=columns)
+
+
+def parse_sheet(path: str, sheet: str, chunk_size: int, spool_dir: str) -> str:
+    """
+    Worker process: parse one sheet and spool its chunks to a pickle file,
+    so the importing process only ever holds one chunk. Returns the file path.
+    """
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        spool_path = os.path.join(spool_dir, f"{sheet}.pkl")
+        with open(spool_path, "wb") as spool:
+            for chunk in iter_sheet_chunks(workbook, sheet, chunk_size):
+                pickle.dump(chunk, spool, protocol=pickle.HIGHEST_PROTOCOL)
+        return spool_path
+    finally:
+        workbook.close()
+
+
+def iter_spooled_chunks(spool_path: str) -> Iterator[pd.DataFrame]:
+    with open(spool_path, "rb") as spool:
+        while True:
+            try:
+                yield pickle.load(spool)
+            except EOFError:
+                return
+
+
+@contextmanager
+def sheet_reader(source, chunk_size: int, parse_workers: int):
+    """
+    Yield a function sheet -> iterator of chunks (None if the sheet is missing).
+
+    For a file path of at least PARALLEL_PARSE_MIN_BYTES, all known sheets
+    are parsed in min(CPU cores, sheets) worker processes right away, capped
+    at parse_workers unless that is 0, so the writer can consume them in
+    dependency order while later sheets are still being parsed.
+    """
+    workbook = openpyxl.load_workbook(source, read_only=True, data_only=True)
+    sheets = [sheet for sheet, _ in SHEET_IMPORTERS if sheet in workbook.sheetnames]
+    workers = min(os.cpu_count() or 1, len(sheets))
+    if parse_workers:
+        workers = min(workers, parse_workers)
+    parallel = (
+        workers > 1
+        and isinstance(source, (str, os.PathLike))
+        and os.path.getsize(source) >= PARALLEL_PARSE_MIN_BYTES
+    )
+    if not parallel:
+        try:
+            yield lambda sheet: iter_sheet_chunks(workbook, sheet, chunk_size) if sheet in sheets else None
+        finally:
+            workbook.close()
+        return
+    workbook.close()
+
+    with tempfile.TemporaryDirectory(prefix="import-sheets-") as spool_dir:
+        # spawn: the importing thread runs next to the web server's threads
+        pool = ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+        )
+        try:
+            futures = {
+                sheet: pool.submit(parse_sheet, os.fspath(source), sheet, chunk_size, spool_dir)
+                for sheet in sheets
+            }
+            yield lambda sheet: iter_spooled_chunks(futures[sheet].result()) if sheet in futures else None
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+
+def import_workbook(db: Session, source, progress: Optional[Callable[[str, dict], None]] = None,
+                    chunk_size: int = IMPORT_CHUNK_SIZE, dry_run: bool = False,
+                    parse_workers: int = IMPORT_PARSE_WORKERS) -> Dict[str, dict]:
+    """
+    Import all known sheets of a workbook in one transaction. Sheets are
+    streamed in chunks of chunk_size rows so memory does not grow with the
+    file size, and large workbooks are parsed in parallel processes (see
+    sheet_reader). Each worker process holds the workbook's shared strings,
+    so parse_workers caps them where memory is tight.
+    Every chunk costs a constant number of statements: batched UPDATE /
+    INSERT / upsert statements, plus one key prefetch per table.
+
+    Returns per-sheet counts. With dry_run nothing is written and the counts
+    and samples describe what the import would insert, update or leave unchanged.
+    """
+    ctx = ImportContext(db, progress, dry_run)
+    with sheet_reader(source, chunk_size, parse_workers) as read_sheet:
+        try:
+            for sheet, import_sheet in SHEET_IMPORTERS:
+                chunks = read_sheet(sheet)
+                if chunks is None:
+                    continue
+                ctx.count(sheet)
+                for chunk in chunks:
+                    import_sheet(ctx, chunk)
+                    ctx.count(sheet, rows=len(chunk))
+                finish = SHEET_FINISHERS.get(sheet)
+                if finish is not None:
+                    finish(ctx)
+            if dry_run:
+                db.rollback()
+                return {sheet: ctx.snapshot(sheet) for sheet in ctx.stats}
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+    reset_sequences(db)
+    return ctx.stats
@@ -0,0 +1,138 @@
+import os
+import uuid
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from . import db
+from .importer import import_workbook
+from .weights import weight_cache
+
+logger = logging.getLogger(__name__)
+
+
+class ImportJob:
+    """Status of one workbook import running in the background."""
+
+    def __init__(self, path: str, filename: str, dry_run: bool = False):
+        self.id = uuid.uuid4().hex
+        self.path = path
+        self.filename = filename
+        self.dry_run = dry_run
+        self.status = "queued"
+        self.sheets: Dict[str, dict] = {}
+        self.current_sheet: Optional[str] = None
+        self.errors: List[str] = []
+        self.created_at = datetime.now(timezone.utc).isoformat()
+        self.started_at: Optional[str] = None
+        self.finished_at: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def progress(self, sheet: str, stats: dict):
+        with self._lock:
+            self.current_sheet = sheet
+            self.sheets[sheet] = stats
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("completed", "failed")
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {
+                "id": self.id,
+                "filename": self.filename,
+                "dry_run": self.dry_run,
+                "status": self.status,
+                "current_sheet": self.current_sheet,
+                "sheets": {sheet: dict(stats) for sheet, stats in self.sheets.items()},
+                "rows_processed": sum(stats.get("rows", 0) for stats in self.sheets.values()),
+                "errors": list(self.errors),
+                "created_at": self.created_at,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+            }
+
+
+class ImportJobManager:
+    """
+    Runs imports in a thread pool so parsing and writing do not block the
+    event loop. Each job gets its own database session and removes its
+    spooled upload when done. The last max_jobs jobs are kept for status queries.
+    """
+
+    def __init__(self, max_workers: int = 1, max_jobs: int = 50):
+        self.max_workers = max_workers
+        self.max_jobs = max_jobs
+        self._jobs: "OrderedDict[str, ImportJob]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def submit(self, path: str, filename: str, dry_run: bool = False) -> ImportJob:
+        job = ImportJob(path, filename, dry_run)
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="import")
+            self._jobs[job.id] = job
+            self._prune()
+            self._executor.submit(self._run, job)
+        return job
+
+    def get(self, job_id: str) -> Optional[ImportJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _prune(self):
+        while len(self._jobs) > self.max_jobs:
+            oldest = next((job_id for job_id, job in self._jobs.items() if job.finished), None)
+            if oldest is None:
+                break
+            del self._jobs[oldest]
+
+    def _run(self, job: ImportJob):
+        job.status = "running"
+        job.started_at = datetime.now(timezone.utc).isoformat()
+        db_sess = db.SessionLocal()
+        try:
+            import_workbook(db_sess, job.path, progress=job.progress, dry_run=job.dry_run)
+            if not job.dry_run:
+                weight_cache.invalidate()
+            job.status = "completed"
+            job.current_sheet = None
+        except Exception as e:
+            logger.exception("Import job %s failed", job.id)
+            with job._lock:
+                job.errors.append(f"{job.current_sheet or 'Workbook'}: {e}")
+            job.status = "failed"
+        finally:
+            db_sess.close()
+            job.finished_at = datetime.now(timezone.utc).isoformat()
+            self._remove_upload(job)
+
+    def shutdown(self):
+        """Drop queued jobs and wait for the running ones."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+        for job in list(self._jobs.values()):
+            if job.status == "queued":
+                job.status = "failed"
+                job.errors.append("Import cancelled on shutdown")
+                self._remove_upload(job)
+
+    @staticmethod
+    def _remove_upload(job: ImportJob):
+        try:
+            os.remove(job.path)
+        except OSError:
+            pass
+
+
+import_jobs = ImportJobManager(
+    max_workers=int(os.getenv("IMPORT_WORKERS", "1")),
+    max_jobs=int(os.getenv("IMPORT_JOBS_KEPT", "50")),
+)
@@ -1,16 +1,29 @@
 import logging
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from . import db, models
+from .counters import counter_buffer
+from .jobs import import_jobs
 from .routers import files, users, teams, auth, criterias, sessions, roles, usersessions
 
 # --- configure logging once, at startup ---
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    counter_buffer.start()
+    yield
+    # Write buffered counter deltas before the worker exits
+    counter_buffer.stop()
+    import_jobs.shutdown()
+    await db.dispose_async_engines()
+
+
 # Create FastAPI app first
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # CORSMiddleware must come BEFORE routers
 app.add_middleware(
@@ -3,6 +3,7 @@ from .sessions import Session, SessionCriterion
 from .users import User, UserCriterion, UserCriterionText, Team
 from .roles import Role
 from .usersessions import UserSessionRole, UserSessionComment
+from .deletions import DeletedRow
 from ..db import Base
 
 __all__ = (
@@ -16,6 +17,7 @@ __all__ = (
     "Role",
     "UserSessionRole",
     "UserSessionComment",
+    "DeletedRow",
     "Base",
 )
 
@@ -2,7 +2,9 @@ from sqlalchemy import (
     Column,
     Integer,
     String,
-    Enum
+    DateTime,
+    Enum,
+    func
 )
 from sqlalchemy.orm import relationship
 from datetime import datetime, timezone
@@ -27,13 +29,16 @@ class Criterion(Base):
     name = Column(String, nullable=False, unique=True)
     type = Column(Enum(CriterionType, name="criteriontype", native_enum=True), nullable=False)
     created_at = Column(
-        String, 
-        default=lambda: datetime.now(timezone.utc).isoformat()
+        DateTime(timezone=True),
+        default=lambda: datetime.now(timezone.utc),
+        server_default=func.now()
     )
     updated_at = Column(
-        String, 
-        default=lambda: datetime.now(timezone.utc).isoformat(),
-        onupdate=lambda: datetime.now(timezone.utc).isoformat()
+        DateTime(timezone=True),
+        default=lambda: datetime.now(timezone.utc),
+        server_default=func.now(),
+        onupdate=lambda: datetime.now(timezone.utc),
+        index=True
     )
 
     # Relationships
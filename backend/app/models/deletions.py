@@ -0,0 +1,63 @@
+import json
+from sqlalchemy import (
+    Column,
+    Integer,
+    String,
+    DateTime,
+    event,
+    func,
+    insert
+)
+from sqlalchemy.orm import Session as OrmSession, object_session
+from datetime import datetime, timezone
+
+from ..db import Base
+from .criterias import Criterion
+from .sessions import Session, SessionCriterion
+from .users import User, UserCriterion, UserCriterionText, Team
+from .roles import Role
+from .usersessions import UserSessionRole, UserSessionComment
+
+# --- Tombstones of deleted rows, used by incremental exports ---
+class DeletedRow(Base):
+    __tablename__ = "deleted_rows"
+
+    id = Column(Integer, primary_key=True, index=True)
+    table_name = Column(String, nullable=False)
+    # Primary key of the deleted row as JSON, e.g. {"id": 5}
+    row_key = Column(String, nullable=False)
+    deleted_at = Column(
+        DateTime(timezone=True),
+        default=lambda: datetime.now(timezone.utc),
+        server_default=func.now(),
+        index=True
+    )
+
+
+TRACKED_MODELS = (
+    User, Team, Role, Criterion, Session, SessionCriterion,
+    UserSessionRole, UserSessionComment, UserCriterionText, UserCriterion,
+)
+
+
+def collect_deleted_row(mapper, connection, target):
+    """Remember a deleted row; the tombstones of a flush are written together in after_flush."""
+    session = object_session(target)
+    if session is None:
+        return
+    session.info.setdefault("deleted_rows", []).append({
+        "table_name": mapper.local_table.name,
+        "row_key": json.dumps({col.key: getattr(target, col.key) for col in mapper.primary_key}),
+        "deleted_at": datetime.now(timezone.utc),
+    })
+
+
+def write_deleted_rows(session, flush_context):
+    rows = session.info.pop("deleted_rows", None)
+    if rows:
+        session.connection().execute(insert(DeletedRow.__table__), rows)
+
+
+for model in TRACKED_MODELS:
+    event.listen(model, "after_delete", collect_deleted_row)
+event.listen(OrmSession, "after_flush", write_deleted_rows)
@@ -1,7 +1,9 @@
 from sqlalchemy import (
     Column,
     Integer,
-    String
+    String,
+    DateTime,
+    func
 )
 from sqlalchemy.orm import relationship
 from datetime import datetime, timezone
@@ -16,13 +18,16 @@ class Role(Base):
     description = Column(String, nullable=True)
 
     created_at = Column(
-        String,
-        default=lambda: datetime.now(timezone.utc).isoformat()
+        DateTime(timezone=True),
+        default=lambda: datetime.now(timezone.utc),
+        server_default=func.now()
     )
     updated_at = Column(
-        String,
-        default=lambda: datetime.now(timezone.utc).isoformat(),
-        onupdate=lambda: datetime.now(timezone.utc).isoformat()
+        DateTime(timezone=True),
+        default=lambda: datetime.now(timezone.utc),
+        server_default=func.now(),
+        onupdate=lambda: datetime.now(timezone.utc),
+        index=True
     )
 
     # Relationships
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Float
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Float, func
 from datetime import datetime, timezone
 from sqlalchemy.orm import relationship
 from ..db import Base
@@ -12,13 +12,16 @@ class Session(Base):
     parent_id = Column(Integer, ForeignKey("sessions.id"), nullable=True)
 
     created_at = Column(
-        String,
-        default=lambda: datetime.now(timezone.utc).isoformat()
+        DateTime(timezone=True),
+        default=lambda: datetime.now(timezone.utc),
+        server_default=func.now()
     )
     updated_at = Column(
-        String,
-        default=lambda: datetime.now(timezone.utc).isoformat(),
-        onupdate=lambda: datetime.now(timezone.utc).isoformat()
+        DateTime(timezone=True),
+        default=lambda: datetime.now(timezone.utc),
+        server_default=func.now(),
+        onupdate=lambda: datetime.now(timezone.utc),
+        index=True
     )
 
     # --- Self-relationship for hierarchy ---
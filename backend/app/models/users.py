@@ -3,8 +3,11 @@ from sqlalchemy import (
     Integer,
     String,
     Boolean,
+    DateTime,
     ForeignKey,
-    Index
+    Index,
+    UniqueConstraint,
+    func
 )
 from ..db import Base
 from datetime import datetime, timezone
@@ -20,13 +23,16 @@ class User(Base):
     email = Column(String, unique=True, index=True, nullable=False)
     password_hash = Column(String, nullable=False)
     created_at = Column(
-        String, 
-        default=lambda: datetime.now(timezone.utc).isoformat()
+        DateTime(timezone=True),
+        default=lambda: datetime.now(timezone.utc),
+        server_default=func.now()
     )
     updated_at = Column(
-        String, 
-        default=lambda: datetime.now(timezone.utc).isoformat(),
-        onupdate=lambda: datetime.now(timezone.utc).isoformat()
+        DateTime(timezone=True),
+        default=lambda: datetime.now(timezone.utc),
+        server_default=func.now(),
+        onupdate=lambda: datetime.now(timezone.utc),
+        index=True
     )
 
     # Relationships
@@ -41,8 +47,9 @@ class Team(Base):
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, unique=True, nullable=False)
     created_at = Column(
-        String, 
-        default=lambda: datetime.now(timezone.utc).isoformat()
+        DateTime(timezone=True),
+        default=lambda: datetime.now(timezone.utc),
+        server_default=func.now()
     )
 
     # Relationships
@@ -65,13 +72,16 @@ class UserCriterion(Base):
     is_fulfilled = Column(Boolean, nullable=False, default=False)
 
     created_at = Column(
-        String, 
-        default=lambda: datetime.now(timezone.utc).isoformat()
+        DateTime(timezone=True),
+        default=lambda: datetime.now(timezone.utc),
+        server_default=func.now()
     )
     updated_at = Column(
-        String, 
-        default=lambda: datetime.now(timezone.utc).isoformat(),
-        onupdate=lambda: datetime.now(timezone.utc).isoformat()
+        DateTime(timezone=True),
+        default=lambda: datetime.now(timezone.utc),
+        server_default=func.now(),
+        onupdate=lambda: datetime.now(timezone.utc),
+        index=True
     )
 
     # Relationships
@@ -79,6 +89,13 @@ class UserCriterion(Base):
     criterion = relationship("Criterion", back_populates="users")
     session = relationship("Session", back_populates="user_criteria")
 
+    # One row per user, session and criterion; the unique index also serves
+    # lookups by (user_id, session_id)
+    __table_args__ = (
+        UniqueConstraint('user_id', 'session_id', 'criterion_id', name='uq_user_criteria_user_session_criterion'),
+        Index('ix_user_criteria_criterion_session', 'criterion_id', 'session_id'),
+    )
+
     text_values = relationship(
         "UserCriterionText",
         back_populates="user_criterion",
@@ -104,7 +121,10 @@ class UserCriterionText(Base):
     text_value = Column(String, nullable=False)
     is_active = Column(Boolean, default=True, nullable=False)  # mark if this is current
     created_at = Column(
-        String, default=lambda: datetime.now(timezone.utc).isoformat()
+        DateTime(timezone=True),
+        default=lambda: datetime.now(timezone.utc),
+        server_default=func.now(),
+        index=True
     )
 
     # Relationship
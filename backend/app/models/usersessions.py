@@ -2,7 +2,11 @@ from sqlalchemy import (
     Column,
     Integer,
     String,
-    ForeignKey
+    DateTime,
+    ForeignKey,
+    Index,
+    UniqueConstraint,
+    func
 )
 from sqlalchemy.orm import relationship
 from datetime import datetime, timezone
@@ -17,11 +21,16 @@ class UserSessionRole(Base):
     role_id = Column(Integer, ForeignKey("roles.id"), nullable=False)
 
     created_at = Column(
-        String, default=lambda: datetime.now(timezone.utc).isoformat()
+        DateTime(timezone=True),
+        default=lambda: datetime.now(timezone.utc),
+        server_default=func.now()
     )
     updated_at = Column(
-        String, default=lambda: datetime.now(timezone.utc).isoformat(),
-        onupdate=lambda: datetime.now(timezone.utc).isoformat()
+        DateTime(timezone=True),
+        default=lambda: datetime.now(timezone.utc),
+        server_default=func.now(),
+        onupdate=lambda: datetime.now(timezone.utc),
+        index=True
     )
 
     # Relationships
@@ -29,6 +38,12 @@ class UserSessionRole(Base):
     session = relationship("Session", backref="user_roles")
     role = relationship("Role", back_populates="user_sessions")
 
+    # One role per user and session
+    __table_args__ = (
+        UniqueConstraint('user_id', 'session_id', name='uq_user_session_roles_user_session'),
+        Index('ix_user_session_roles_session_user', 'session_id', 'user_id'),
+    )
+
 class UserSessionComment(Base):
     __tablename__ = "user_session_comments"
 
@@ -38,13 +53,17 @@ class UserSessionComment(Base):
     text = Column(String, nullable=False)
 
     created_at = Column(
-        String,
-        default=lambda: datetime.now(timezone.utc).isoformat()
+        DateTime(timezone=True),
+        default=lambda: datetime.now(timezone.utc),
+        server_default=func.now(),
+        index=True
     )
     updated_at = Column(
-        String,
-        default=lambda: datetime.now(timezone.utc).isoformat(),
-        onupdate=lambda: datetime.now(timezone.utc).isoformat()
+        DateTime(timezone=True),
+        default=lambda: datetime.now(timezone.utc),
+        server_default=func.now(),
+        onupdate=lambda: datetime.now(timezone.utc),
+        index=True
     )
 
     # --- Relationships ---
@@ -1,29 +1,36 @@
 from fastapi import APIRouter, HTTPException, Depends
-from sqlalchemy.orm import Session
-from .. import db, models, schemas, security
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from .. import models, schemas, security
+from ..db import get_async_db
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
 @router.post("/register", response_model=schemas.UserRead)
-def register_user(user: schemas.UserCreate, session: Session = Depends(db.get_db)):
-    existing_user = session.query(models.User).filter(models.User.email == user.email).first()
+async def register_user(user: schemas.UserCreate, session: AsyncSession = Depends(get_async_db)):
+    existing_user = await session.scalar(select(models.User).where(models.User.email == user.email))
     if existing_user:
         raise HTTPException(status_code=400, detail="Email already registered")
 
+    # bcrypt is CPU bound, keep it off the event loop
     new_user = models.User(
         first_name=user.first_name,
         last_name=user.last_name,
         email=user.email,
-        password_hash=security.hash_password(user.password)
+        password_hash=await run_in_threadpool(security.hash_password, user.password)
     )
     session.add(new_user)
-    session.commit()
-    session.refresh(new_user)
+    await session.commit()
+    await session.refresh(new_user, ["team"])
     return new_user
 
 @router.post("/login", response_model=schemas.UserRead)
-def login_user(user: schemas.UserLogin, session: Session = Depends(db.get_db)):
-    db_user = session.query(models.User).filter(models.User.email == user.email).first()
-    if not db_user or not security.verify_password(user.password, db_user.password_hash):
+async def login_user(user: schemas.UserLogin, session: AsyncSession = Depends(get_async_db)):
+    db_user = await session.scalar(
+        select(models.User).options(selectinload(models.User.team)).where(models.User.email == user.email)
+    )
+    if not db_user or not await run_in_threadpool(security.verify_password, user.password, db_user.password_hash):
         raise HTTPException(status_code=401, detail="Invalid email or password")
     return db_user
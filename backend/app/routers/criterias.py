@@ -1,8 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException, Query, Body
-from sqlalchemy.orm import Session, joinedload
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, joinedload, selectinload
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy import update, insert, select, case, tuple_, bindparam
 from typing import List, Optional
-from enum import Enum
-from .. import db
+from datetime import datetime, timezone
+from ..db import get_async_db, get_async_read_db, dialect_insert
+from ..counters import counter_buffer
 from ..models import Criterion, User, UserCriterion, UserCriterionText, Session as SessionModel
 from ..schemas.criterias import (
     CriterionType,
@@ -11,6 +15,8 @@ from ..schemas.criterias import (
     CriterionRead,
     UserCriterionUpdate,
     UserCriterionRead,
+    UpdateAction,
+    UserCriterionBatch,
 )
 import logging
 
@@ -20,13 +26,9 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/criteria", tags=["criteria"])
 
-# ----- Database Dependency -----
-def get_db():
-    db_sess = db.SessionLocal()
-    try:
-        yield db_sess
-    finally:
-        db_sess.close()
+# Columns of the unique constraint on user_criteria
+USER_CRITERION_KEY = ["user_id", "session_id", "criterion_id"]
+
 
 # ----- Helper Functions -----
 def get_or_404(session: Session, model, id: int, name: str):
@@ -35,23 +37,18 @@ def get_or_404(session: Session, model, id: int, name: str):
         raise HTTPException(status_code=404, detail=f"{name} not found")
     return obj
 
-def get_or_create_usercriterion(session: Session, user_id: int, criterion_id: int, session_id: int):
-    uc = (
-        session.query(UserCriterion)
-        .filter_by(user_id=user_id, criterion_id=criterion_id, session_id=session_id)
-        .first()
+def user_criterion_options():
+    """Eager loads for everything UserCriterionRead serializes; lazy loads are not possible on AsyncSession."""
+    return (
+        joinedload(UserCriterion.criterion),
+        selectinload(UserCriterion.text_values),
+        selectinload(UserCriterion.user).selectinload(User.team),
     )
-    if not uc:
-        uc = UserCriterion(user_id=user_id, criterion_id=criterion_id, session_id=session_id)
-        session.add(uc)
-        session.commit()
-        session.refresh(uc)
-    return uc
 
 # ----- Criterion -----
 @router.post("", response_model=CriterionRead)
-def create_criterion(payload: CriterionCreate, session: Session = Depends(get_db)):
-    existing = session.query(Criterion).filter(Criterion.name == payload.name).first()
+async def create_criterion(payload: CriterionCreate, session: AsyncSession = Depends(get_async_db)):
+    existing = await session.scalar(select(Criterion).where(Criterion.name == payload.name))
     if existing:
         raise HTTPException(status_code=400, detail="Criterion already exists")
 
@@ -60,34 +57,36 @@ def create_criterion(payload: CriterionCreate, session: Session = Depends(get_db
         type=CriterionType(payload.type)
     )
     session.add(new_crit)
-    session.commit()
-    session.refresh(new_crit)
+    await session.commit()
+    await session.refresh(new_crit)
     return new_crit
 
 @router.get("/{criterion_id}", response_model=CriterionRead)
-def get_criterion(criterion_id: int, db: Session = Depends(get_db)):
-    criterion = db.query(Criterion).filter(Criterion.id == criterion_id).first()
+async def get_criterion(criterion_id: int, db: AsyncSession = Depends(get_async_read_db)):
+    criterion = await db.get(Criterion, criterion_id)
     if not criterion:
         raise HTTPException(status_code=404, detail="Criterion not found")
     return criterion
 
 @router.put("/{criterion_id}", response_model=CriterionRead)
-def update_criterion(criterion_id: int, payload: CriterionUpdate, db: Session = Depends(get_db)):
-    criterion = db.query(Criterion).filter(Criterion.id == criterion_id).first()
+async def update_criterion(criterion_id: int, payload: CriterionUpdate, db: AsyncSession = Depends(get_async_db)):
+    criterion = await db.get(Criterion, criterion_id)
     if not criterion:
         raise HTTPException(status_code=404, detail="Criterion not found")
     criterion.name = payload.name
-    db.commit()
-    db.refresh(criterion)
+    await db.commit()
+    await db.refresh(criterion)
     return criterion
 
 @router.get("", response_model=List[CriterionRead])
-def list_criteria(session: Session = Depends(get_db)):
-    criteria = session.query(Criterion).all()
+async def list_criteria(session: AsyncSession = Depends(get_async_read_db)):
+    criteria = (await session.scalars(select(Criterion))).all()
     result = []
     for crit in criteria:
         # Check if there are any UserCriterion entries for this criterion
-        has_deps = session.query(UserCriterion).filter_by(criterion_id=crit.id).first() is not None
+        has_deps = await session.scalar(
+            select(UserCriterion.id).filter_by(criterion_id=crit.id).limit(1)
+        ) is not None
 
         result.append({
             "id": crit.id,
@@ -99,20 +98,36 @@ def list_criteria(session: Session = Depends(get_db)):
         })
     return result
 
+def buffered_counts(data) -> dict:
+    """Stored count_values of user criteria, keyed like the counter buffer."""
+    return {(uc.user_id, uc.criterion_id, uc.session_id): uc.count_value for uc in data}
+
+
+def set_buffered_counts(data, counts: dict):
+    for uc in data:
+        set_committed_value(uc, "count_value", counts[(uc.user_id, uc.criterion_id, uc.session_id)])
+
 # ----- UserCriterion -----
 @router.get("/user/{user_id}/session/{session_id}", response_model=List[UserCriterionRead])
-def get_user_criteria(user_id: int, session_id: int, session: Session = Depends(get_db)):
+async def get_user_criteria(user_id: int, session_id: int, session: AsyncSession = Depends(get_async_read_db)):
     # Ensure session exists
-    db_session = session.query(SessionModel).filter(SessionModel.id == session_id).first()
+    db_session = await session.get(SessionModel, session_id)
     if not db_session:
         raise HTTPException(status_code=404, detail="Session not found")
 
-    data = (
-        session.query(UserCriterion)
-        .options(joinedload(UserCriterion.criterion), joinedload(UserCriterion.text_values))
-        .filter_by(user_id=user_id, session_id=session_id)
-        .all()
-    )   
+    async def load():
+        return (await session.scalars(
+            select(UserCriterion)
+            .options(*user_criterion_options())
+            .filter_by(user_id=user_id, session_id=session_id)
+            .execution_options(populate_existing=True)
+        )).all()
+
+    if counter_buffer.enabled:
+        data, counts = await counter_buffer.read_merged(load, buffered_counts)
+        set_buffered_counts(data, counts)
+    else:
+        data = await load()
 
     for uc in data:
         uc.last_texts = [t.text_value for t in sorted(uc.text_values, key=lambda x: x.created_at, reverse=True) if not t.is_active][:5]
@@ -120,51 +135,274 @@ def get_user_criteria(user_id: int, session_id: int, session: Session = Depends(
     return data
 
 # ----- Unified Update Endpoint -----
-class UpdateAction(str, Enum):
-    increment = "increment"
-    decrement = "decrement"
-    set_boolean = "set_boolean"
-    set_text = "set_text"
+def user_criterion_changes(action: UpdateAction, value):
+    """
+    Return (update values, insert values) for an action. The update values
+    are SQL expressions applied to an existing row, the insert values
+    initialize a row that does not exist yet.
+    """
+    if action == UpdateAction.increment:
+        return {"count_value": UserCriterion.count_value + 1}, {"count_value": 1}
+    if action == UpdateAction.decrement:
+        return {
+            "count_value": case((UserCriterion.count_value > 0, UserCriterion.count_value - 1), else_=0)
+        }, {"count_value": 0}
+    if action == UpdateAction.set_boolean:
+        return {"is_fulfilled": bool(value)}, {"is_fulfilled": bool(value)}
+    return {"updated_at": datetime.now(timezone.utc)}, {}
+
+def apply_user_criterion_action(
+    session: Session, criterion_id: int, user_id: int, session_id: int, action: UpdateAction, value
+) -> UserCriterion:
+    """
+    Apply an action with a single UPDATE ... RETURNING. The existence of the
+    criterion and session is only checked when no row was affected, in which
+    case the row is created with the action already applied.
+    """
+    if action == UpdateAction.set_text and (not value or not isinstance(value, str)):
+        raise HTTPException(status_code=400, detail="Text value must be provided")
+
+    changes, initial = user_criterion_changes(action, value)
+    uc = session.scalars(
+        update(UserCriterion)
+        .where(
+            UserCriterion.user_id == user_id,
+            UserCriterion.criterion_id == criterion_id,
+            UserCriterion.session_id == session_id
+        )
+        .values(**changes)
+        .returning(UserCriterion)
+    ).first()
+
+    if uc is None:
+        get_or_404(session, Criterion, criterion_id, "Criterion")
+        get_or_404(session, SessionModel, session_id, "Session")
+        values = dict(user_id=user_id, criterion_id=criterion_id, session_id=session_id, **initial)
+        stmt = dialect_insert(session, UserCriterion)
+        if stmt is None:
+            uc = UserCriterion(**values)
+            session.add(uc)
+            session.flush()
+        else:
+            # A concurrent request may have created the row in the meantime
+            uc = session.scalars(
+                stmt.values(**values)
+                .on_conflict_do_update(
+                    index_elements=USER_CRITERION_KEY,
+                    set_={"updated_at": datetime.now(timezone.utc), **changes}
+                )
+                .returning(UserCriterion)
+            ).one()
+
+    if action == UpdateAction.set_text:
+        # Deactivate previous text entries
+        session.execute(
+            update(UserCriterionText)
+            .where(UserCriterionText.user_criterion_id == uc.id, UserCriterionText.is_active.is_(True))
+            .values(is_active=False)
+        )
+        # Add new active text
+        session.add(UserCriterionText(user_criterion_id=uc.id, text_value=value, is_active=True))
+
+    return uc
 
 @router.put("/{criterion_id}/{user_id}/session/{session_id}", response_model=UserCriterionRead)
-def update_user_criterion(
+async def update_user_criterion(
     criterion_id: int,
     user_id: int,
     session_id: int,
     action: UpdateAction = Query(...),
     payload: Optional[UserCriterionUpdate] = Body(None),
-    session: Session = Depends(get_db)
+    session: AsyncSession = Depends(get_async_db)
 ):
-    criterion = get_or_404(session, Criterion, criterion_id, "Criterion")
-    db_session = get_or_404(session, SessionModel, session_id, "Session")
-    uc = get_or_create_usercriterion(session, user_id, criterion_id, session_id)
-
     value = getattr(payload, "value", None)
 
-    if action == UpdateAction.increment:
-        uc.count_value = (uc.count_value or 0) + 1
-    elif action == UpdateAction.decrement:
-        uc.count_value = max((uc.count_value or 0) - 1, 0)
-    elif action == UpdateAction.set_boolean:
-        uc.is_fulfilled = bool(value)
-    elif action == UpdateAction.set_text:
-        if not value or not isinstance(value, str):
+    # Write-behind mode: buffer counter deltas instead of writing them
+    if counter_buffer.enabled and action in (UpdateAction.increment, UpdateAction.decrement):
+        async def load():
+            return (await session.scalars(
+                select(UserCriterion)
+                .options(*user_criterion_options())
+                .filter_by(user_id=user_id, criterion_id=criterion_id, session_id=session_id)
+                .execution_options(populate_existing=True)
+            )).all()
+
+        data, counts = await counter_buffer.read_merged(load, buffered_counts)
+        uc = data[0] if data else None
+        if uc and uc.criterion.type.value == CriterionType.countable.value:
+            key = (user_id, criterion_id, session_id)
+            delta = 1 if action == UpdateAction.increment else -min(counts[key], 1)
+            counter_buffer.add(key, delta)
+            set_committed_value(uc, "count_value", counts[key] + delta)
+            return uc
+
+    uc = await session.run_sync(apply_user_criterion_action, criterion_id, user_id, session_id, action, value)
+    await session.commit()
+    return await session.scalar(
+        select(UserCriterion)
+        .options(*user_criterion_options())
+        .where(UserCriterion.id == uc.id)
+        .execution_options(populate_existing=True)
+    )
+
+# ----- Batch Update Endpoint -----
+@router.post("/batch", response_model=List[UserCriterionRead])
+async def batch_update_user_criteria(payload: UserCriterionBatch, session: AsyncSession = Depends(get_async_db)):
+    """
+    Apply many user-criterion operations in one transaction. Counter
+    operations are applied in request order to the locked current counts,
+    floored at 0 after every step like single requests, and the results are
+    written with one batched UPDATE. The last set_boolean per triple wins
+    and set_text operations are stored in order. Returns the resulting rows.
+    """
+    ops = payload.operations
+    if not ops:
+        return []
+    for op in ops:
+        if op.action == UpdateAction.set_text and (not op.value or not isinstance(op.value, str)):
             raise HTTPException(status_code=400, detail="Text value must be provided")
-        # Deactivate previous text entries
-        for t in uc.text_values:
-            t.is_active = False
-        # Add new active text
-        new_text = UserCriterionText(user_criterion_id=uc.id, text_value=value, is_active=True)
-        session.add(new_text)
 
-    session.commit()
-    session.refresh(uc)
-    return uc
+    triples = list(dict.fromkeys((op.user_id, op.criterion_id, op.session_id) for op in ops))
+    key = tuple_(UserCriterion.user_id, UserCriterion.criterion_id, UserCriterion.session_id)
+    ids = {
+        (row.user_id, row.criterion_id, row.session_id): row.id
+        for row in await session.execute(
+            select(UserCriterion.id, UserCriterion.user_id, UserCriterion.criterion_id, UserCriterion.session_id)
+            .where(key.in_(triples))
+        )
+    }
+
+    # Create missing rows in one statement
+    missing = [t for t in triples if t not in ids]
+    if missing:
+        criterion_ids = {t[1] for t in missing}
+        session_ids = {t[2] for t in missing}
+        if len((await session.scalars(select(Criterion.id).where(Criterion.id.in_(criterion_ids)))).all()) < len(criterion_ids):
+            raise HTTPException(status_code=404, detail="Criterion not found")
+        if len((await session.scalars(select(SessionModel.id).where(SessionModel.id.in_(session_ids)))).all()) < len(session_ids):
+            raise HTTPException(status_code=404, detail="Session not found")
+        rows = [
+            {"user_id": u, "criterion_id": c, "session_id": s, "count_value": 0, "is_fulfilled": False}
+            for u, c, s in missing
+        ]
+        stmt = dialect_insert(session, UserCriterion)
+        if stmt is None:
+            stmt = insert(UserCriterion)
+        else:
+            # Rows created concurrently are returned instead of failing the batch
+            stmt = stmt.on_conflict_do_update(
+                index_elements=USER_CRITERION_KEY, set_={"user_id": stmt.excluded.user_id}
+            )
+        created = await session.execute(
+            stmt.returning(
+                UserCriterion.id, UserCriterion.user_id, UserCriterion.criterion_id, UserCriterion.session_id
+            ),
+            rows
+        )
+        ids.update({(row.user_id, row.criterion_id, row.session_id): row.id for row in created})
+
+    steps = []
+    booleans = {}
+    texts = []
+    for op in ops:
+        triple = (op.user_id, op.criterion_id, op.session_id)
+        if op.action == UpdateAction.increment:
+            steps.append((triple, op.delta))
+        elif op.action == UpdateAction.decrement:
+            steps.append((triple, -op.delta))
+        elif op.action == UpdateAction.set_boolean:
+            booleans[triple] = bool(op.value)
+        else:
+            texts.append((ids[triple], op.value))
+
+    table = UserCriterion.__table__
+    now = datetime.now(timezone.utc)
+    if steps:
+        buffered = set()
+        if counter_buffer.enabled:
+            # Write-behind mode buffers countable criteria like single updates do
+            types = dict((await session.execute(
+                select(Criterion.id, Criterion.type).where(Criterion.id.in_({t[1] for t, _ in steps}))
+            )).all())
+            buffered = {t for t, _ in steps if types[t[1]].value == CriterionType.countable.value}
+        direct = {t for t, _ in steps} - buffered
+        start = {}
+        if direct:
+            # Lock in id order so that concurrent batches cannot deadlock
+            stored = dict((await session.execute(
+                select(table.c.id, table.c.count_value)
+                .where(table.c.id.in_({ids[t] for t in direct}))
+                .order_by(table.c.id)
+                .with_for_update()
+            )).all())
+            start.update({t: stored[ids[t]] for t in direct})
+        if buffered:
+            async def load():
+                return dict((await session.execute(
+                    select(table.c.id, table.c.count_value).where(table.c.id.in_({ids[t] for t in buffered}))
+                )).all())
+
+            _, merged = await counter_buffer.read_merged(load, lambda stored: {t: stored[ids[t]] for t in buffered})
+            start.update(merged)
+        counts = dict(start)
+        for t, step in steps:
+            counts[t] = max(counts[t] + step, 0)
+        for t in buffered:
+            if counts[t] != start[t]:
+                counter_buffer.add(t, counts[t] - start[t])
+        if direct:
+            await session.execute(
+                update(table)
+                .where(table.c.id == bindparam("uc_id"))
+                .values(count_value=bindparam("count"), updated_at=now),
+                [{"uc_id": ids[t], "count": counts[t]} for t in direct]
+            )
+    if booleans:
+        await session.execute(
+            update(table)
+            .where(table.c.id == bindparam("uc_id"))
+            .values(is_fulfilled=bindparam("fulfilled"), updated_at=now),
+            [{"uc_id": ids[t], "fulfilled": v} for t, v in booleans.items()]
+        )
+    if texts:
+        text_uc_ids = {uc_id for uc_id, _ in texts}
+        await session.execute(
+            update(UserCriterionText)
+            .where(UserCriterionText.user_criterion_id.in_(text_uc_ids), UserCriterionText.is_active.is_(True))
+            .values(is_active=False)
+        )
+        last = {uc_id: i for i, (uc_id, _) in enumerate(texts)}
+        await session.execute(
+            insert(UserCriterionText),
+            [
+                {"user_criterion_id": uc_id, "text_value": value, "is_active": last[uc_id] == i}
+                for i, (uc_id, value) in enumerate(texts)
+            ]
+        )
+
+    await session.commit()
+
+    async def load():
+        return (await session.scalars(
+            select(UserCriterion)
+            .options(*user_criterion_options())
+            .where(UserCriterion.id.in_(ids.values()))
+            .execution_options(populate_existing=True)
+        )).all()
+
+    if counter_buffer.enabled:
+        data, counts = await counter_buffer.read_merged(load, buffered_counts)
+        set_buffered_counts(data, counts)
+    else:
+        data = await load()
+    for uc in data:
+        uc.last_texts = [t.text_value for t in uc.text_values if not t.is_active][:5]
+    return data
 
 # ----- List all UserCriterion -----
 @router.get("/usercriteria", response_model=List[UserCriterionRead])
-def list_all_user_criteria(session: Session = Depends(get_db)):
-    data = session.query(UserCriterion).options(joinedload(UserCriterion.criterion), joinedload(UserCriterion.text_values)).all()
+async def list_all_user_criteria(session: AsyncSession = Depends(get_async_read_db)):
+    data = (await session.scalars(select(UserCriterion).options(*user_criterion_options()))).all()
     for uc in data:
         uc.active_text = next((t.text_value for t in uc.text_values if t.is_active), None)
         uc.last_texts = [t.text_value for t in sorted(uc.text_values, key=lambda x: x.created_at, reverse=True) if not t.is_active][:5]
@@ -172,30 +410,34 @@ def list_all_user_criteria(session: Session = Depends(get_db)):
 
 # ----- Get UserCriterion for a Criterion -----
 @router.get("/{criterion_id}/users", response_model=List[UserCriterionRead])
-def get_user_criteria_for_criterion(
-    criterion_id: int, session_id: Optional[int] = None, session: Session = Depends(get_db)
+async def get_user_criteria_for_criterion(
+    criterion_id: int, session_id: Optional[int] = None, session: AsyncSession = Depends(get_async_read_db)
 ):
-    query = session.query(UserCriterion).join(User).filter(UserCriterion.criterion_id == criterion_id)
+    query = (
+        select(UserCriterion)
+        .join(User)
+        .options(*user_criterion_options())
+        .where(UserCriterion.criterion_id == criterion_id)
+    )
     if session_id:
-        query = query.filter(UserCriterion.session_id == session_id)
+        query = query.where(UserCriterion.session_id == session_id)
     
-    results = query.all()
+    results = (await session.scalars(query)).all()
     for uc in results:
-        _ = uc.user  # preload user relationship
         uc.last_texts = [t.text_value for t in sorted(uc.text_values, key=lambda x: x.created_at, reverse=True) if not t.is_active][:5]
     return results
 
 @router.delete("/{criterion_id}")
-def delete_criterion(criterion_id: int, session: Session = Depends(get_db)):
-    crit = session.get(Criterion, criterion_id)
+async def delete_criterion(criterion_id: int, session: AsyncSession = Depends(get_async_db)):
+    crit = await session.get(Criterion, criterion_id)
     if not crit:
         raise HTTPException(status_code=404, detail="Criterion not found")
     
     # Optional: check if criterion is used in any UserCriterion
-    in_use = session.query(UserCriterion).filter_by(criterion_id=criterion_id).first()
+    in_use = await session.scalar(select(UserCriterion.id).filter_by(criterion_id=criterion_id).limit(1))
     if in_use:
         raise HTTPException(status_code=400, detail="Cannot delete criterion: it is in use")
     
-    session.delete(crit)
-    session.commit()
+    await session.delete(crit)
+    await session.commit()
     return {"detail": "Criterion deleted"}
\ No newline at end of file
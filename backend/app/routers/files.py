@@ -1,424 +1,441 @@
-from fastapi import APIRouter, Depends, Response, UploadFile, File, HTTPException
+from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, Query, Header, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-import pandas as pd
-from io import BytesIO
-from datetime import datetime
-from sqlalchemy import text
+import csv
+import io
+import os
+import tempfile
+import zipfile
+import xlsxwriter
+from enum import Enum
+from typing import Optional
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import select, func
 
 from .. import db, models
-from ..security import hash_password  # for default passwords on users
+from ..db import SessionLocal, get_read_db
+from ..export_cache import export_cache, data_version
+from ..jobs import import_jobs
+from ..counters import counter_buffer
+from ..weights import weight_cache
+from ..snapshots import SnapshotError, write_snapshot, restore_snapshot
 
 router = APIRouter(prefix="/files", tags=["files"])
 
-def get_db():
-    db_sess = db.SessionLocal()
+
+# -------------------------
+# EXPORT ALL MODELS (XLSX, CSV, PARQUET)
+# -------------------------
+EXPORT_CHUNK_SIZE = 1000
+EXPORT_SPOOL_SIZE = 16 * 1024 * 1024
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+# Rows per worksheet, including the header row
+XLSX_MAX_ROWS = 1048576
+# Incremental export cursors are moved back by this many seconds, so that rows
+# committed late by long transactions or stamped by app servers with lagging
+# clocks are picked up by the next delta
+EXPORT_CURSOR_OVERLAP_SECONDS = int(os.getenv("EXPORT_CURSOR_OVERLAP_SECONDS", "300"))
+
+
+def export_tables(since: Optional[datetime] = None):
+    """
+    (sheet name, SELECT) for every exported table, in workbook order.
+    Only plain columns are selected so rows can be streamed from the cursor.
+
+    With since only rows created or updated after it are
+    selected, plus a DeletedRows sheet with the tombstones of rows deleted
+    after it. Teams and SessionCriteria have no updated_at and are small, so
+    they are always exported in full. Texts are exported per user criterion
+    that got a new text, so deactivated texts are included as well.
+    """
+    active_text = (
+        select(models.UserCriterionText.text_value)
+        .where(
+            models.UserCriterionText.user_criterion_id == models.UserCriterion.id,
+            models.UserCriterionText.is_active.is_(True)
+        )
+        .limit(1)
+        .scalar_subquery()
+        .label("active_text")
+    )
+    tables = [
+        ("Users", select(
+            models.User.id, models.User.first_name, models.User.last_name, models.User.email,
+            models.User.password_hash, models.User.team_id, models.User.created_at, models.User.updated_at
+        ).order_by(models.User.id)),
+        ("Teams", select(
+            models.Team.id, models.Team.name, models.Team.created_at
+        ).order_by(models.Team.id)),
+        ("Roles", select(
+            models.Role.id, models.Role.name, models.Role.description,
+            models.Role.created_at, models.Role.updated_at
+        ).order_by(models.Role.id)),
+        ("Criteria", select(
+            models.Criterion.id, models.Criterion.name, models.Criterion.type,
+            models.Criterion.created_at, models.Criterion.updated_at
+        ).order_by(models.Criterion.id)),
+        ("Sessions", select(
+            models.Session.id, models.Session.title, models.Session.description, models.Session.parent_id,
+            models.Session.created_at, models.Session.updated_at
+        ).order_by(models.Session.id)),
+        ("SessionCriteria", select(
+            models.SessionCriterion.session_id, models.SessionCriterion.criterion_id,
+            models.SessionCriterion.role_id, models.SessionCriterion.weight
+        ).order_by(
+            models.SessionCriterion.session_id, models.SessionCriterion.criterion_id, models.SessionCriterion.role_id
+        )),
+        ("UserSessionRoles", select(
+            models.UserSessionRole.id, models.UserSessionRole.user_id, models.UserSessionRole.session_id,
+            models.UserSessionRole.role_id, models.UserSessionRole.created_at, models.UserSessionRole.updated_at
+        ).order_by(models.UserSessionRole.id)),
+        ("UserSessionComments", select(
+            models.UserSessionComment.id, models.UserSessionComment.user_id, models.UserSessionComment.session_id,
+            models.UserSessionComment.text, models.UserSessionComment.created_at, models.UserSessionComment.updated_at
+        ).order_by(models.UserSessionComment.id)),
+        ("UserCriterionTexts", select(
+            models.UserCriterionText.id, models.UserCriterionText.user_criterion_id,
+            models.UserCriterionText.text_value, models.UserCriterionText.is_active,
+            models.UserCriterionText.created_at
+        ).order_by(models.UserCriterionText.id)),
+        ("UserCriteria", select(
+            models.UserCriterion.id, models.UserCriterion.user_id, models.UserCriterion.criterion_id,
+            models.UserCriterion.session_id, models.UserCriterion.count_value, models.UserCriterion.is_fulfilled,
+            active_text, models.UserCriterion.created_at, models.UserCriterion.updated_at
+        ).order_by(models.UserCriterion.id)),
+    ]
+    if since is None:
+        return tables
+
+    changed_texts = (
+        select(models.UserCriterionText.user_criterion_id)
+        .where(models.UserCriterionText.created_at > since)
+    )
+    delta_filters = {
+        "Users": models.User.updated_at > since,
+        "Roles": models.Role.updated_at > since,
+        "Criteria": models.Criterion.updated_at > since,
+        "Sessions": models.Session.updated_at > since,
+        "UserSessionRoles": models.UserSessionRole.updated_at > since,
+        "UserSessionComments": models.UserSessionComment.updated_at > since,
+        "UserCriterionTexts": models.UserCriterionText.user_criterion_id.in_(changed_texts),
+        "UserCriteria": models.UserCriterion.updated_at > since,
+    }
+    tables = [
+        (sheet_name, stmt.where(delta_filters[sheet_name]) if sheet_name in delta_filters else stmt)
+        for sheet_name, stmt in tables
+    ]
+    tables.append(("DeletedRows", select(
+        models.DeletedRow.id, models.DeletedRow.table_name, models.DeletedRow.row_key, models.DeletedRow.deleted_at
+    ).where(models.DeletedRow.deleted_at > since).order_by(models.DeletedRow.id)))
+    return tables
+
+
+def export_value(value):
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, float):
+        # weights are the only float columns
+        return round(value, 2)
+    if isinstance(value, datetime):
+        # ISO strings keep the files importable and xlsx has no time zones
+        return value.isoformat()
+    return value
+
+
+def iter_export_chunks(db: Session, stmt):
+    """Yield converted rows of a table in chunks using a server-side cursor."""
+    result = db.execute(stmt.execution_options(yield_per=EXPORT_CHUNK_SIZE))
+    for partition in result.partitions():
+        yield [[export_value(v) for v in row] for row in partition]
+
+
+def write_xlsx(db: Session, fh, tables):
+    """Write all tables to fh with xlsxwriter, keeping only one row in memory."""
+    workbook = xlsxwriter.Workbook(fh, {
+        "constant_memory": True,
+        "strings_to_formulas": False,
+        "strings_to_urls": False,
+    })
+    for sheet_name, stmt in tables:
+        worksheet = workbook.add_worksheet(sheet_name)
+        worksheet.write_row(0, 0, list(stmt.selected_columns.keys()))
+        row_idx = 1
+        for chunk in iter_export_chunks(db, stmt):
+            if row_idx + len(chunk) > XLSX_MAX_ROWS:
+                workbook.close()
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"{sheet_name} has more rows than an xlsx sheet can hold. "
+                           "Export with format=csv.zip or format=parquet instead."
+                )
+            for row in chunk:
+                worksheet.write_row(row_idx, 0, row)
+                row_idx += 1
+    workbook.close()
+
+
+def write_csv_zip(db: Session, fh, tables):
+    """Write one CSV file per table into a zip archive."""
+    with zipfile.ZipFile(fh, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for sheet_name, stmt in tables:
+            with archive.open(f"{sheet_name}.csv", "w") as member:
+                text_member = io.TextIOWrapper(member, encoding="utf-8", newline="")
+                writer = csv.writer(text_member)
+                writer.writerow(stmt.selected_columns.keys())
+                for chunk in iter_export_chunks(db, stmt):
+                    writer.writerows(chunk)
+                text_member.flush()
+                text_member.detach()
+
+
+def arrow_schema(stmt):
+    import pyarrow as pa
+
+    fields = []
+    for name, column in stmt.selected_columns.items():
+        try:
+            python_type = column.type.python_type
+        except NotImplementedError:
+            python_type = str
+        if python_type is bool:
+            arrow_type = pa.bool_()
+        elif python_type is int:
+            arrow_type = pa.int64()
+        elif python_type is float:
+            arrow_type = pa.float64()
+        else:
+            arrow_type = pa.string()
+        fields.append(pa.field(name, arrow_type))
+    return pa.schema(fields)
+
+
+def write_parquet_zip(db: Session, fh, tables):
+    """Write one Parquet file per table into a zip archive, one row group per chunk."""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise HTTPException(status_code=501, detail="Parquet export requires pyarrow to be installed.")
+
+    with zipfile.ZipFile(fh, "w", compression=zipfile.ZIP_STORED) as archive:
+        for sheet_name, stmt in tables:
+            schema = arrow_schema(stmt)
+            with archive.open(f"{sheet_name}.parquet", "w") as member:
+                with pq.ParquetWriter(member, schema) as writer:
+                    for chunk in iter_export_chunks(db, stmt):
+                        writer.write_table(pa.Table.from_pylist(
+                            [dict(zip(schema.names, row)) for row in chunk], schema=schema
+                        ))
+
+
+class ExportFormat(str, Enum):
+    xlsx = "xlsx"
+    csv_zip = "csv.zip"
+    parquet = "parquet"
+
+
+EXPORT_WRITERS = {
+    ExportFormat.xlsx: (write_xlsx, XLSX_MEDIA_TYPE, "export.xlsx"),
+    ExportFormat.csv_zip: (write_csv_zip, "application/zip", "export.csv.zip"),
+    ExportFormat.parquet: (write_parquet_zip, "application/zip", "export.parquet.zip"),
+}
+
+
+def iter_file(fh, chunk_size: int = 64 * 1024):
     try:
-        yield db_sess
+        while chunk := fh.read(chunk_size):
+            yield chunk
     finally:
-        db_sess.close()
+        fh.close()
 
 
-# -------------------------
-# EXPORT ALL MODELS TO XLSX
-# -------------------------
-@router.get("/export")
-def export_all_xlsx(db: Session = Depends(get_db)):
-    def make_naive(dt):
-        if dt is None:
-            return None
-        if hasattr(dt, "tzinfo") and dt.tzinfo is not None:
-            return dt.replace(tzinfo=None)
-        return dt
-
-    # Users
-    df_users = pd.DataFrame([{
-        "id": int(u.id),
-        "first_name": u.first_name,
-        "last_name": u.last_name,
-        "email": u.email,
-        "password_hash": u.password_hash,
-        "team_id": u.team.id if u.team else None,
-        "created_at": make_naive(u.created_at),
-        "updated_at": make_naive(u.updated_at)
-    } for u in db.query(models.User).all()])
-
-    # Teams
-    df_teams = pd.DataFrame([{
-        "id": int(t.id),
-        "name": t.name,
-        "created_at": make_naive(t.created_at)
-    } for t in db.query(models.Team).all()])
-
-    # Roles
-    df_roles = pd.DataFrame([{
-        "id": int(r.id),
-        "name": r.name,
-        "description": r.description,
-        "created_at": make_naive(r.created_at),
-        "updated_at": make_naive(r.updated_at)
-    } for r in db.query(models.Role).all()])
-
-    # Criteria
-    df_criteria = pd.DataFrame([{
-        "id": int(c.id),
-        "name": c.name,
-        "type": c.type.value,
-        "created_at": make_naive(c.created_at),
-        "updated_at": make_naive(c.updated_at)
-    } for c in db.query(models.Criterion).all()])
-
-    # Sessions
-    df_sessions = pd.DataFrame([{
-        "id": int(s.id),
-        "title": s.title,
-        "description": s.description,
-        "parent_id": s.parent_id,
-        "created_at": make_naive(s.created_at),
-        "updated_at": make_naive(s.updated_at)
-    } for s in db.query(models.Session).all()])
-
-    # Session-Criterion Associations
-    df_session_criteria = pd.DataFrame([{
-        "session_id": sc.session_id,
-        "criterion_id": sc.criterion_id,
-        "role_id": sc.role_id,
-        "weight": round(float(sc.weight), 2)
-    } for sc in db.query(models.SessionCriterion).all()])
-
-    # User-Session Roles
-    df_user_session_roles = pd.DataFrame([{
-        "id": usr.id,
-        "user_id": usr.user_id,
-        "session_id": usr.session_id,
-        "role_id": usr.role_id,
-        "created_at": make_naive(usr.created_at),
-        "updated_at": make_naive(usr.updated_at)
-    } for usr in db.query(models.UserSessionRole).all()])
-
-    # User-Session Comments (optional)
-    df_user_session_comments = pd.DataFrame([{
-        "id": c.id,
-        "user_id": c.user_id,
-        "session_id": c.session_id,
-        "text": c.text,
-        "created_at": make_naive(c.created_at),
-        "updated_at": make_naive(c.updated_at)
-    } for c in db.query(models.UserSessionComment).all()])
-
-    # UserCriterionText
-    df_uc_texts = pd.DataFrame([{
-        "id": t.id,
-        "user_criterion_id": t.user_criterion_id,
-        "text_value": t.text_value,
-        "is_active": t.is_active,
-        "created_at": make_naive(t.created_at)
-    } for t in db.query(models.UserCriterionText).all()])
-
-    # User-Criteria
-    df_user_criteria = pd.DataFrame([{
-        "id": uc.id,
-        "user_id": uc.user_id,
-        "criterion_id": uc.criterion_id,
-        "session_id": uc.session_id,
-        "count_value": uc.count_value,
-        "is_fulfilled": uc.is_fulfilled,
-        "active_text": uc.active_text,
-        "created_at": make_naive(uc.created_at),
-        "updated_at": make_naive(uc.updated_at)
-    } for uc in db.query(models.UserCriterion).all()])
-
-    # Save all DataFrames to Excel workbook in memory
-    output = BytesIO()
-    with pd.ExcelWriter(output, engine="xlsxwriter") as writer:
-        df_users.to_excel(writer, sheet_name="Users", index=False)
-        df_teams.to_excel(writer, sheet_name="Teams", index=False)
-        df_roles.to_excel(writer, sheet_name="Roles", index=False)
-        df_criteria.to_excel(writer, sheet_name="Criteria", index=False)
-        df_sessions.to_excel(writer, sheet_name="Sessions", index=False)
-        df_session_criteria.to_excel(writer, sheet_name="SessionCriteria", index=False)
-        df_user_session_roles.to_excel(writer, sheet_name="UserSessionRoles", index=False)
-        df_user_session_comments.to_excel(writer, sheet_name="UserSessionComments", index=False)
-        df_uc_texts.to_excel(writer, sheet_name="UserCriterionTexts", index=False)
-        df_user_criteria.to_excel(writer, sheet_name="UserCriteria", index=False)
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags
+
 
+def stream_export(write, db: Session, tables, media_type: str, headers: dict) -> StreamingResponse:
+    """Write an export into a spooled temp file and stream it."""
+    output = tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_SIZE)
+    try:
+        write(db, output, tables)
+    except Exception:
+        output.close()
+        raise
     output.seek(0)
-    return Response(
-        content=output.read(),
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers={"Content-Disposition": "attachment; filename=export.xlsx"}
-    )
+    return StreamingResponse(iter_file(output), media_type=media_type, headers=headers)
+
+
+def use_snapshot(db: Session):
+    """
+    Run the rest of db's transaction in one REPEATABLE READ snapshot on
+    PostgreSQL, so that the data version and every exported table describe
+    the same data. Must be called before db runs its first query.
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        db.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+
+
+def parse_since(since: str) -> datetime:
+    """Parse a since cursor; timestamps without an offset are UTC."""
+    try:
+        ts = datetime.fromisoformat(since)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="since must be an ISO 8601 timestamp")
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return ts.astimezone(timezone.utc)
+
+
+@router.get("/export")
+def export_all(
+    format: ExportFormat = Query(ExportFormat.xlsx),
+    since: Optional[str] = Query(None),
+    if_none_match: Optional[str] = Header(None),
+    db: Session = Depends(get_read_db)
+):
+    """
+    Export all tables. Files are cached on disk per data version, so repeated
+    exports of unchanged data are served from the cache, and a matching
+    If-None-Match returns 304 without building anything. The data version and
+    the export are read from the same snapshot.
+
+    With since only the rows changed after that timestamp and the tombstones
+    of deleted rows are exported. The X-Export-Cursor header holds the value
+    to pass as since on the next incremental export: the database clock of
+    the export's snapshot minus EXPORT_CURSOR_OVERLAP_SECONDS. Consecutive
+    deltas therefore overlap, and consumers must apply them idempotently
+    (importing a delta is). Full exports may be read from a replica;
+    incremental ones are read from the primary, since a lagging replica
+    would miss rows older than the cursor for good.
+
+    Snapshot restores and TRUNCATEs write no tombstones; consumers need a
+    full export after either.
+    """
+    write, media_type, filename = EXPORT_WRITERS[format]
+    if since is not None:
+        tables = export_tables(parse_since(since))
+        with SessionLocal() as primary:
+            use_snapshot(primary)
+            now = primary.scalar(select(func.now()))
+            if now.tzinfo is None:
+                now = now.replace(tzinfo=timezone.utc)
+            cursor = (now - timedelta(seconds=EXPORT_CURSOR_OVERLAP_SECONDS)).isoformat()
+            return stream_export(write, primary, tables, media_type, {
+                "Content-Disposition": f"attachment; filename=delta-{filename}",
+                "X-Export-Cursor": cursor
+            })
+
+    use_snapshot(db)
+    version = data_version(db)
+    etag = f'"{format.value}-{version}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+
+    if export_cache.enabled:
+        key = f"{version}.{format.value}"
+        cached = export_cache.open(key)
+        if cached is None:
+            with export_cache.new_file() as tmp:
+                try:
+                    write(db, tmp, export_tables())
+                except Exception:
+                    tmp.close()
+                    os.remove(tmp.name)
+                    raise
+            cached = export_cache.put(key, tmp.name)
+        # Stream from the open handle: the file may be evicted while it is served
+        return StreamingResponse(iter_file(cached), media_type=media_type, headers={
+            **headers,
+            "Content-Disposition": f"attachment; filename={filename}",
+            "Content-Length": str(os.fstat(cached.fileno()).st_size)
+        })
+
+    return stream_export(write, db, export_tables(), media_type, {
+        **headers, "Content-Disposition": f"attachment; filename={filename}"
+    })
 
 
 # -------------------------
 # IMPORT ALL MODELS FROM XLSX
 # -------------------------
-@router.post("/import")
-async def import_all_xlsx(file: UploadFile = File(...), db: Session = Depends(get_db)):
+IMPORT_UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+@router.post("/import", status_code=202)
+async def import_all_xlsx(file: UploadFile = File(...), dry_run: bool = Query(False)):
+    """
+    Spool the upload to disk and import it in the background. Poll GET /files/import/{job_id}.
+    With dry_run nothing is written; the job reports per-sheet counts and
+    samples of the rows that would be inserted, updated or left unchanged.
+    """
     if not file.filename.endswith((".xlsx", ".xls")):
         raise HTTPException(status_code=400, detail="Invalid file format. Please upload an Excel file.")
 
+    suffix = ".xls" if file.filename.endswith(".xls") else ".xlsx"
+    with tempfile.NamedTemporaryFile(prefix="import-", suffix=suffix, delete=False) as spool:
+        while chunk := await file.read(IMPORT_UPLOAD_CHUNK_SIZE):
+            spool.write(chunk)
+    return import_jobs.submit(spool.name, file.filename, dry_run).to_dict()
+
+
+@router.get("/import/{job_id}")
+def get_import_job(job_id: str):
+    job = import_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Import job not found")
+    return job.to_dict()
+
+
+# -------------------------
+# BINARY SNAPSHOTS (POSTGRESQL COPY)
+# -------------------------
+def require_postgres():
+    if db.engine.dialect.name != "postgresql":
+        raise HTTPException(status_code=501, detail="Snapshots require PostgreSQL.")
+
+
+@router.get("/snapshot")
+def download_snapshot():
+    """Dump all tables with binary COPY from one consistent snapshot into a zip archive."""
+    require_postgres()
+    output = tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_SIZE)
     try:
-        contents = await file.read()
-        xls = pd.ExcelFile(BytesIO(contents))
-
-        # Track mapping from old IDs to new IDs (if needed)
-        user_id_map = {}
-        team_id_map = {}
-        role_id_map = {}
-        criterion_id_map = {}
-        session_id_map = {}
-
-        # --- 1. TEAMS ---
-        if "Teams" in xls.sheet_names:
-            df_teams = pd.read_excel(xls, sheet_name="Teams")
-            for _, row in df_teams.iterrows():
-                team = db.query(models.Team).filter_by(name=row["name"]).first()
-                if team:
-                    # Update if needed
-                    team.name = row["name"]
-                    team_id_map[int(row["id"])] = team.id
-                else:
-                    team = models.Team(id=int(row["id"]), name=row["name"])
-                    db.add(team)
-                    db.flush()
-                    team_id_map[int(row["id"])] = team.id
-            db.commit()
-
-        # --- 2. ROLES ---
-        if "Roles" in xls.sheet_names:
-            df_roles = pd.read_excel(xls, sheet_name="Roles")
-            for _, row in df_roles.iterrows():
-                role = db.query(models.Role).filter_by(name=row["name"]).first()
-                if role:
-                    role.description = row.get("description") if not pd.isna(row.get("description")) else None
-                    role_id_map[int(row["id"])] = role.id
-                else:
-                    role = models.Role(id=int(row["id"]), name=row["name"], description=row.get("description"))
-                    db.add(role)
-                    db.flush()
-                    role_id_map[int(row["id"])] = role.id
-            db.commit()
-
-        # --- 3. USERS ---
-        if "Users" in xls.sheet_names:
-            df_users = pd.read_excel(xls, sheet_name="Users")
-            for _, row in df_users.iterrows():
-                user = db.query(models.User).filter_by(email=row["email"]).first()
-                if user:
-                    # Update fields
-                    user.first_name = row["first_name"]
-                    user.last_name = row["last_name"]
-                    user.team_id = team_id_map.get(int(row["team_id"])) if not pd.isna(row.get("team_id")) else None
-                    user_id_map[int(row["id"])] = user.id
-                else:
-                    user = models.User(
-                        id=int(row["id"]),
-                        first_name=row["first_name"],
-                        last_name=row["last_name"],
-                        email=row["email"],
-                        password_hash=row.get("password_hash") or hash_password("test"),
-                        team_id=team_id_map.get(int(row["team_id"])) if not pd.isna(row.get("team_id")) else None
-                    )
-                    db.add(user)
-                    db.flush()
-                    user_id_map[int(row["id"])] = user.id
-            db.commit()
-
-        # --- 4. CRITERIA ---
-        if "Criteria" in xls.sheet_names:
-            df_criteria = pd.read_excel(xls, sheet_name="Criteria")
-            for _, row in df_criteria.iterrows():
-                criterion = db.query(models.Criterion).filter_by(name=row["name"], type=row["type"]).first()
-                if criterion:
-                    # Update if needed
-                    criterion.name = row["name"]
-                    criterion.type = row["type"]
-                    criterion_id_map[int(row["id"])] = criterion.id
-                else:
-                    criterion = models.Criterion(id=int(row["id"]), name=row["name"], type=row["type"])
-                    db.add(criterion)
-                    db.flush()
-                    criterion_id_map[int(row["id"])] = criterion.id
-            db.commit()
-
-        # --- 5. SESSIONS ---
-        if "Sessions" in xls.sheet_names:
-            df_sessions = pd.read_excel(xls, sheet_name="Sessions")
-            for _, row in df_sessions.iterrows():
-                parent_ref = session_id_map.get(int(row["parent_id"])) if not pd.isna(row.get("parent_id")) else None
-                session = db.query(models.Session).filter_by(title=row["title"], parent_id=parent_ref).first()
-                if session:
-                    session.description = row.get("description")
-                    session.parent_id = parent_ref
-                    session_id_map[int(row["id"])] = session.id
-                else:
-                    session = models.Session(
-                        id=int(row["id"]),
-                        title=row["title"],
-                        description=row.get("description"),
-                        parent_id=parent_ref
-                    )
-                    db.add(session)
-                    db.flush()
-                    session_id_map[int(row["id"])] = session.id
-            db.commit()
-
-        # --- 6. SESSION-CRITERIA ASSOCIATIONS ---
-        if "SessionCriteria" in xls.sheet_names:
-            df_sc = pd.read_excel(xls, sheet_name="SessionCriteria")
-            for _, row in df_sc.iterrows():
-                session_ref = session_id_map[int(row["session_id"])]
-                criterion_ref = criterion_id_map[int(row["criterion_id"])]
-                role_ref = role_id_map.get(int(row["role_id"])) if not pd.isna(row.get("role_id")) else None
-                assoc = db.query(models.SessionCriterion).filter_by(
-                    session_id=session_ref, criterion_id=criterion_ref, role_id=role_ref
-                ).first()
-                if assoc:
-                    assoc.weight = float(row.get("weight", 1.0))
-                else:
-                    assoc = models.SessionCriterion(
-                        session_id=session_ref,
-                        criterion_id=criterion_ref,
-                        role_id=role_ref,
-                        weight=float(row.get("weight", 1.0))
-                    )
-                    db.add(assoc)
-            db.commit()
-
-        # --- 7. USER-CRITERION TEXTS ---
-        if "UserCriterionTexts" in xls.sheet_names:
-            df_uc_texts = pd.read_excel(xls, sheet_name="UserCriterionTexts")
-            
-            for _, row in df_uc_texts.iterrows():
-                user_criterion_ref = db.query(models.UserCriterion).get(row["user_criterion_id"])
-                if not user_criterion_ref:
-                    continue 
-
-                text_value = row["text_value"]
-                if pd.isna(text_value):
-                    text_value = ""
-
-                # Check if ID already exists in DB
-                uct = db.query(models.UserCriterionText).get(int(row["id"]))
-                if uct:
-                    uct.user_criterion_id = user_criterion_ref.id
-                    uct.text_value = text_value
-                    uct.is_active = row["is_active"]
-                    uct.created_at = row.get("created_at") or uct.created_at
-                else:
-                    db.add(models.UserCriterionText(
-                        id=int(row["id"]),
-                        user_criterion_id=user_criterion_ref.id,
-                        text_value=text_value,
-                        is_active=row["is_active"],
-                        created_at=row.get("created_at") or datetime.now().isoformat()
-                    ))
-
-            db.commit()
-
-        # --- 8. USER-SESSION COMMENTS ---
-        if "UserSessionComments" in xls.sheet_names:
-            df_usr_comments = pd.read_excel(xls, sheet_name="UserSessionComments")
-            for _, row in df_usr_comments.iterrows():
-                user_ref = user_id_map[int(row["user_id"])]
-                session_ref = session_id_map[int(row["session_id"])]
-
-                # Try to get comment by ID first
-                comment = db.query(models.UserSessionComment).get(int(row["id"]))
-
-                if comment:
-                    # Update existing comment
-                    comment.user_id = user_ref
-                    comment.session_id = session_ref
-                    comment.text = row["text"]
-                    comment.created_at = row.get("created_at") or comment.created_at
-                    comment.updated_at = row.get("updated_at") or datetime.now().isoformat()
-                else:
-                    # Insert new comment with same ID
-                    db.add(models.UserSessionComment(
-                        id=int(row["id"]),
-                        user_id=user_ref,
-                        session_id=session_ref,
-                        text=row["text"],
-                        created_at=row.get("created_at") or datetime.now().isoformat(),
-                        updated_at=row.get("updated_at") or datetime.now().isoformat()
-                    ))
-            db.commit()
-
-        # --- 9. USER-SESSION ROLES ---
-        if "UserSessionRoles" in xls.sheet_names:
-            df_usr_roles = pd.read_excel(xls, sheet_name="UserSessionRoles")
-            for _, row in df_usr_roles.iterrows():
-                user_ref = user_id_map[int(row["user_id"])]
-                session_ref = session_id_map[int(row["session_id"])]
-                role_ref = role_id_map[int(row["role_id"])]
-
-                usr_role = db.query(models.UserSessionRole).filter_by(
-                    user_id=user_ref, session_id=session_ref, role_id=role_ref
-                ).first()
-
-                if usr_role:
-                    usr_role.updated_at = row.get("updated_at") or usr_role.updated_at
-                else:
-                    db.add(models.UserSessionRole(
-                        id=int(row["id"]),
-                        user_id=user_ref,
-                        session_id=session_ref,
-                        role_id=role_ref,
-                        created_at=row.get("created_at") or datetime.now().isoformat(),
-                        updated_at=row.get("updated_at") or datetime.now().isoformat()
-                    ))
-            db.commit()
-
-        # --- 10. USER-CRITERIA ---
-        if "UserCriteria" in xls.sheet_names:
-            df_uc = pd.read_excel(xls, sheet_name="UserCriteria")
-            for _, row in df_uc.iterrows():
-                user_ref = user_id_map[int(row["user_id"])]
-                criterion_ref = criterion_id_map[int(row["criterion_id"])]
-                session_ref = session_id_map.get(int(row["session_id"])) if not pd.isna(row.get("session_id")) else None
-                uc = db.query(models.UserCriterion).filter_by(
-                    user_id=user_ref, criterion_id=criterion_ref, session_id=session_ref
-                ).first()
-
-                if uc:
-                    uc.count_value = int(row.get("count_value", 0))
-                    uc.is_fulfilled = bool(row.get("is_fulfilled", False))
-                else:
-                    uc = models.UserCriterion(
-                        user_id=user_ref,
-                        criterion_id=criterion_ref,
-                        session_id=session_ref,
-                        count_value=int(row.get("count_value", 0)),
-                        is_fulfilled=bool(row.get("is_fulfilled", False))
-                    )
-                    db.add(uc)
-                    db.flush()
-            db.commit()
-
-        # Ensure auto-increment sequences continue from the correct ID
-        try:
-            sequence_resets = [
-                ("users", "users_id_seq"),
-                ("teams", "teams_id_seq"),
-                ("roles", "roles_id_seq"),
-                ("criteria", "criteria_id_seq"),
-                ("sessions", "sessions_id_seq"),
-                ("user_criteria", "user_criteria_id_seq"),
-                ("user_criterion_texts", "user_criterion_texts_id_seq"),
-                ("user_session_comments", "user_session_comments_id_seq"),
-                ("user_session_roles", "user_session_roles_id_seq"),
-            ]
-
-            for table, seq in sequence_resets:
-                db.execute(
-                    text(f"SELECT setval('{seq}', (SELECT COALESCE(MAX(id), 0) + 1 FROM {table}), false)")
-                )
-            db.commit()
-        except Exception as seq_err:
-            print(f"Warning: Failed to reset sequences — {seq_err}")
+        with db.engine.connect().execution_options(isolation_level="REPEATABLE READ") as conn:
+            with conn.begin():
+                manifest = write_snapshot(conn, output)
+    except Exception:
+        output.close()
+        raise
+    output.seek(0)
+    stamp = manifest["created_at"][:19].replace(":", "-")
+    return StreamingResponse(
+        iter_file(output),
+        media_type="application/zip",
+        headers={"Content-Disposition": f"attachment; filename=snapshot-{stamp}.zip"}
+    )
 
-        return {"message": "Import completed successfully."}
 
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error importing Excel file: {str(e)}")
+@router.post("/snapshot/restore")
+def restore_snapshot_archive(file: UploadFile = File(...)):
+    """
+    Replace all data with a snapshot in one transaction. No tombstones are
+    written, so incremental export consumers must start over with a full export.
+    """
+    require_postgres()
+    # Pending counter deltas belong to the data that is about to be replaced
+    counter_buffer.flush()
+    try:
+        with db.engine.begin() as conn:
+            manifest = restore_snapshot(conn, file.file)
+    except (SnapshotError, zipfile.BadZipFile) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid snapshot: {str(e)}")
+    weight_cache.invalidate()
+    return {
+        "message": "Snapshot restored successfully.",
+        "created_at": manifest["created_at"],
+        "tables": {table["name"]: table["rows"] for table in manifest["tables"]},
+    }
@@ -1,80 +1,242 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import func
-from typing import List
-
-from .. import db
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session, joinedload, selectinload
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, select, insert, exists, literal, true, case
+from typing import Iterable, List, Optional
+import logging
+
+from ..db import get_async_db, get_async_read_db, dialect_insert
+from ..scoring import compute_scores
+from ..weights import weight_cache
 from ..models import (
     Session as SessionModel,
     SessionCriterion,
     Criterion,
     User,
-    UserCriterion,
-    UserSessionRole
+    UserCriterion
 )
 from ..schemas import SessionCreate, SessionRead, SessionUpdate
 
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter(prefix="/sessions", tags=["sessions"])
 
 
-# --- DB Dependency ---
-def get_db():
-    db_sess = db.SessionLocal()
-    try:
-        yield db_sess
-    finally:
-        db_sess.close()
+# --- Helper: create user_criteria entries for sessions ---
+def create_user_criteria_for_sessions(
+    db: Session,
+    session_ids: Optional[Iterable[int]] = None,
+    user_ids: Optional[Iterable[int]] = None
+) -> int:
+    """
+    Create one UserCriterion per user per session per criterion,
+    ignoring role_id. The missing (user, session, criterion) triples are
+    computed with a single anti-join and inserted with one INSERT ... SELECT.
+    Restrict the work with session_ids / user_ids; None means all of them.
+    Does not commit. Returns the number of inserted rows.
+    """
+    if session_ids is not None:
+        session_ids = list(session_ids)
+        if not session_ids:
+            return 0
+    if user_ids is not None:
+        user_ids = list(user_ids)
+        if not user_ids:
+            return 0
+
+    pairs = (
+        select(SessionCriterion.session_id, SessionCriterion.criterion_id)
+        .distinct()
+    )
+    if session_ids is not None:
+        pairs = pairs.where(SessionCriterion.session_id.in_(session_ids))
+    pairs = pairs.subquery()
+
+    missing = (
+        select(
+            User.id,
+            pairs.c.session_id,
+            pairs.c.criterion_id,
+            literal(0),
+            literal(False)
+        )
+        .select_from(User)
+        .join(pairs, true())
+        .where(
+            ~exists().where(
+                UserCriterion.user_id == User.id,
+                UserCriterion.session_id == pairs.c.session_id,
+                UserCriterion.criterion_id == pairs.c.criterion_id
+            )
+        )
+    )
+    if user_ids is not None:
+        missing = missing.where(User.id.in_(user_ids))
+
+    columns = [
+        UserCriterion.user_id,
+        UserCriterion.session_id,
+        UserCriterion.criterion_id,
+        UserCriterion.count_value,
+        UserCriterion.is_fulfilled
+    ]
+    stmt = dialect_insert(db, UserCriterion)
+    if stmt is not None:
+        # Rows inserted concurrently since the anti-join are skipped
+        stmt = stmt.from_select(columns, missing).on_conflict_do_nothing(
+            index_elements=["user_id", "session_id", "criterion_id"]
+        )
+    else:
+        stmt = insert(UserCriterion).from_select(columns, missing)
+
+    inserted = db.execute(stmt).rowcount
+    logger.info("Created %s user criteria", inserted)
+    return inserted
 
 
-# --- Helper: create user_criteria entries for a session ---
-def create_user_criteria_for_session(db: Session, session: SessionModel):
+# --- Helper: recursive CTE over a session subtree ---
+def session_subtree_cte(root_ids: Optional[Iterable[int]] = None, max_depth: Optional[int] = None):
     """
-    Create one UserCriterion per user per session per criterion,
-    ignoring role_id. Log the creation process.
+    Recursive CTE yielding (id, parent_id, depth) for the given sessions
+    and all of their descendants. Without root_ids the whole forest below
+    the top-level sessions is returned. Roots have depth 0; max_depth
+    limits how many levels below the roots are included.
     """
-    users = db.query(User).all()
+    anchor = select(SessionModel.id, SessionModel.parent_id, literal(0).label("depth"))
+    if root_ids is None:
+        anchor = anchor.where(SessionModel.parent_id.is_(None))
+    else:
+        anchor = anchor.where(SessionModel.id.in_(list(root_ids)))
+    tree = anchor.cte("session_tree", recursive=True)
+
+    recursive = (
+        select(SessionModel.id, SessionModel.parent_id, tree.c.depth + 1)
+        .join(tree, SessionModel.parent_id == tree.c.id)
+    )
+    if max_depth is not None:
+        recursive = recursive.where(tree.c.depth < max_depth)
+    return tree.union_all(recursive)
 
-    for user in users:
-        for assoc in session.session_criteria_assoc:
-            # Check if UserCriterion already exists
-            exists = db.query(UserCriterion).filter_by(
-                user_id=user.id,
-                session_id=session.id,
-                criterion_id=assoc.criterion_id
-            ).first()
 
-            if exists:
-                continue
+# --- Helper: load session trees with two queries ---
+def load_session_tree(
+    db: Session,
+    root_ids: Optional[Iterable[int]] = None,
+    max_depth: Optional[int] = None
+) -> List[dict]:
+    """
+    Load the session trees below root_ids (or all top-level sessions)
+    as nested dicts. Sessions come from one recursive CTE query, their
+    criteria associations from a second one; the nesting is built in
+    memory by parent_id.
+    """
+    tree = session_subtree_cte(root_ids, max_depth)
+    rows = db.execute(
+        select(SessionModel, tree.c.depth)
+        .join(tree, tree.c.id == SessionModel.id)
+        .order_by(tree.c.depth, SessionModel.id)
+    ).all()
 
-            uc = UserCriterion(
-                user_id=user.id,
-                session_id=session.id,
-                criterion_id=assoc.criterion_id
-            )
-            db.add(uc)
-            db.commit()
+    nodes = {}
+    roots = []
+    for session, depth in rows:
+        node = session_to_dict(session)
+        nodes[session.id] = node
+        if depth == 0:
+            roots.append(node)
+        else:
+            nodes[session.parent_id]["children"].append(node)
+
+    assocs = db.scalars(
+        select(SessionCriterion)
+        .options(joinedload(SessionCriterion.criterion))
+        .where(SessionCriterion.session_id.in_(select(tree.c.id)))
+    ).all()
+    for sc in assocs:
+        nodes[sc.session_id]["criteria"].append({
+            "criterion": sc.criterion,
+            "role_id": sc.role_id,
+            "weight": sc.weight
+        })
+
+    return roots
+
+
+# --- Helper: copy a whole session subtree ---
+def copy_session_tree(db: Session, session_id: int, title: str) -> int:
+    """
+    Copy a session, its criteria and all descendants without committing.
+    The subtree is read with one recursive query, every tree level is
+    inserted with one bulk INSERT, all criteria associations are copied
+    with one INSERT ... SELECT and user criteria are seeded once for all
+    new sessions. Returns the id of the copied root session.
+    """
+    tree = session_subtree_cte([session_id])
+    rows = db.execute(
+        select(
+            SessionModel.id,
+            SessionModel.parent_id,
+            SessionModel.title,
+            SessionModel.description,
+            tree.c.depth
+        )
+        .join(tree, tree.c.id == SessionModel.id)
+        .order_by(tree.c.depth, SessionModel.id)
+    ).all()
 
-    db.commit()
+    levels = {}
+    for row in rows:
+        levels.setdefault(row.depth, []).append(row)
 
+    id_map = {}
+    for depth in sorted(levels):
+        level = levels[depth]
+        values = [
+            {
+                "title": title if depth == 0 else f"{row.title} (Copy)",
+                "description": row.description,
+                "parent_id": row.parent_id if depth == 0 else id_map[row.parent_id]
+            }
+            for row in level
+        ]
+        new_ids = db.scalars(
+            insert(SessionModel).returning(SessionModel.id, sort_by_parameter_order=True),
+            values
+        ).all()
+        id_map.update(zip((row.id for row in level), new_ids))
+
+    # Copy criteria of every session in one statement, remapping session ids
+    db.execute(
+        insert(SessionCriterion).from_select(
+            ["session_id", "criterion_id", "role_id", "weight"],
+            select(
+                case(id_map, value=SessionCriterion.session_id),
+                SessionCriterion.criterion_id,
+                SessionCriterion.role_id,
+                SessionCriterion.weight
+            ).where(SessionCriterion.session_id.in_(list(id_map)))
+        )
+    )
 
+    create_user_criteria_for_sessions(db, id_map.values())
+    return id_map[session_id]
 
 
 # --- CREATE ---
 @router.post("", response_model=SessionRead)
-def create_session(payload: SessionCreate, db: Session = Depends(get_db)):
+async def create_session(payload: SessionCreate, db: AsyncSession = Depends(get_async_db)):
     session = SessionModel(
         title=payload.title,
         description=payload.description,
         parent_id=payload.parent_id
     )
     db.add(session)
-    db.commit()
-    db.refresh(session)
+    await db.flush()
 
     # Add criteria if any
     for crit in payload.criteria or []:
-        db_crit = db.query(Criterion).filter_by(id=crit.id).first()
+        db_crit = await db.get(Criterion, crit.id)
         if db_crit:
             assoc = SessionCriterion(
                 session_id=session.id,
@@ -83,50 +245,38 @@ def create_session(payload: SessionCreate, db: Session = Depends(get_db)):
                 weight=crit.weight
             )
             db.add(assoc)
-    db.commit()
+    await db.flush()
 
-    create_user_criteria_for_session(db, session)
+    await db.run_sync(create_user_criteria_for_sessions, [session.id])
+    await db.commit()
+    weight_cache.invalidate([session.id])
 
-    # Reload with relations
-    session = db.query(SessionModel).options(
-        joinedload(SessionModel.session_criteria_assoc).joinedload(SessionCriterion.criterion),
-        joinedload(SessionModel.children)
-    ).filter(SessionModel.id == session.id).first()
-
-    return session_to_dict(session)
+    return (await db.run_sync(load_session_tree, [session.id]))[0]
 
 
 # --- READ ALL ---
 @router.get("", response_model=List[SessionRead])
-def get_sessions(db: Session = Depends(get_db)):
-    sessions = db.query(SessionModel).options(
-        joinedload(SessionModel.session_criteria_assoc).joinedload(SessionCriterion.criterion),
-        joinedload(SessionModel.children)
-    ).all()
-    return [session_to_dict(s) for s in sessions if s.parent_id is None]
+async def get_sessions(max_depth: Optional[int] = Query(None, ge=0), db: AsyncSession = Depends(get_async_read_db)):
+    return await db.run_sync(load_session_tree, max_depth=max_depth)
 
 
 # --- READ ONE ---
 @router.get("/{session_id}", response_model=SessionRead)
-def get_session(session_id: int, db: Session = Depends(get_db)):
-    session = db.query(SessionModel).options(
-        joinedload(SessionModel.session_criteria_assoc).joinedload(SessionCriterion.criterion),
-        joinedload(SessionModel.children)
-    ).filter(SessionModel.id == session_id).first()
-
-    if not session:
+async def get_session(session_id: int, max_depth: Optional[int] = Query(None, ge=0), db: AsyncSession = Depends(get_async_read_db)):
+    sessions = await db.run_sync(load_session_tree, [session_id], max_depth)
+    if not sessions:
         raise HTTPException(status_code=404, detail="Session not found")
 
-    return session_to_dict(session)
+    return sessions[0]
 
 
 # --- UPDATE ---
 @router.put("/{session_id}", response_model=SessionRead)
-def update_session(session_id: int, payload: SessionUpdate, db: Session = Depends(get_db)):
-    session = db.query(SessionModel).options(
-        joinedload(SessionModel.session_criteria_assoc).joinedload(SessionCriterion.criterion),
-        joinedload(SessionModel.children)
-    ).filter(SessionModel.id == session_id).first()
+async def update_session(session_id: int, payload: SessionUpdate, db: AsyncSession = Depends(get_async_db)):
+    session = await db.scalar(select(SessionModel).options(
+        selectinload(SessionModel.session_criteria_assoc).joinedload(SessionCriterion.criterion),
+        selectinload(SessionModel.children)
+    ).where(SessionModel.id == session_id))
 
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
@@ -137,22 +287,21 @@ def update_session(session_id: int, payload: SessionUpdate, db: Session = Depend
 
     # Update or add criteria
     new_criteria = payload.criteria or []
-    existing_assoc = {assoc.criterion_id: assoc for assoc in session.session_criteria_assoc}
 
     for crit in new_criteria:
         # Check if row with this session_id, criterion_id, role_id exists
-        assoc = db.query(SessionCriterion).filter_by(
+        assoc = await db.scalar(select(SessionCriterion).filter_by(
             session_id=session.id,
             criterion_id=crit.id,
             role_id=crit.role_id
-        ).first()
+        ))
         
         if assoc:
             # Only update the weight
             assoc.weight = crit.weight
         else:
             # Add new row
-            db_crit = db.query(Criterion).filter_by(id=crit.id).first()
+            db_crit = await db.get(Criterion, crit.id)
             if db_crit:
                 new_assoc = SessionCriterion(
                     session_id=session.id,
@@ -162,129 +311,63 @@ def update_session(session_id: int, payload: SessionUpdate, db: Session = Depend
                 )
                 db.add(new_assoc)
 
-    db.commit()
-    create_user_criteria_for_session(db, session)
+    await db.flush()
+    await db.run_sync(create_user_criteria_for_sessions, [session.id])
+    await db.commit()
+    weight_cache.invalidate([session.id])
 
-    # Reload updated session
-    session = db.query(SessionModel).options(
-        joinedload(SessionModel.session_criteria_assoc).joinedload(SessionCriterion.criterion),
-        joinedload(SessionModel.children)
-    ).filter(SessionModel.id == session.id).first()
-
-    return session_to_dict(session)
+    return (await db.run_sync(load_session_tree, [session.id]))[0]
 
 
 # --- DELETE ---
 @router.delete("/{session_id}", response_model=dict)
-def delete_session(session_id: int, db: Session = Depends(get_db)):
-    session = db.query(SessionModel).filter(SessionModel.id == session_id).first()
+async def delete_session(session_id: int, db: AsyncSession = Depends(get_async_db)):
+    session = await db.get(SessionModel, session_id)
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
 
-    db.delete(session)
-    db.commit()
+    await db.delete(session)
+    await db.commit()
+    weight_cache.invalidate()
     return {"status": "success", "message": f"Session {session_id} deleted"}
 
 @router.post("/{session_id}/copy", response_model=SessionRead)
-def copy_session(session_id: int, payload: dict, db: Session = Depends(get_db)):
+async def copy_session(session_id: int, payload: dict, db: AsyncSession = Depends(get_async_db)):
     """
     Duplicate a session (including metadata, criteria, and optionally child sessions).
     """
-    session = db.query(SessionModel).options(
-        joinedload(SessionModel.session_criteria_assoc).joinedload(SessionCriterion.criterion),
-        joinedload(SessionModel.children)
-    ).filter(SessionModel.id == session_id).first()
-
+    session = await db.get(SessionModel, session_id)
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
 
     new_title = payload.get("title") or f"{session.title} (Copy)"
+    copied_id = await db.run_sync(copy_session_tree, session_id, new_title)
+    await db.commit()
 
-    # Create new session
-    copied_session = SessionModel(
-        title=new_title,
-        description=session.description,
-        parent_id=session.parent_id
-    )
-    db.add(copied_session)
-    db.commit()
-    db.refresh(copied_session)
-
-    # Copy criteria
-    for assoc in session.session_criteria_assoc:
-        new_assoc = SessionCriterion(
-            session_id=copied_session.id,
-            criterion_id=assoc.criterion_id,
-            role_id=assoc.role_id,
-            weight=assoc.weight
-        )
-        db.add(new_assoc)
-    db.commit()
-
-    # Create user criteria for copied session
-    create_user_criteria_for_session(db, copied_session)
-
-    # Recursively copy children
-    def copy_children(parent_session: SessionModel, new_parent: SessionModel):
-        for child in parent_session.children:
-            copied_child = SessionModel(
-                title=f"{child.title} (Copy)",
-                description=child.description,
-                parent_id=new_parent.id
-            )
-            db.add(copied_child)
-            db.commit()
-            db.refresh(copied_child)
-
-            # Copy criteria
-            for assoc in child.session_criteria_assoc:
-                new_assoc = SessionCriterion(
-                    session_id=copied_child.id,
-                    criterion_id=assoc.criterion_id,
-                    role_id=assoc.role_id,
-                    weight=assoc.weight
-                )
-                db.add(new_assoc)
-            db.commit()
-
-            create_user_criteria_for_session(db, copied_child)
-
-            # Recurse for deeper hierarchy
-            copy_children(child, copied_child)
-
-    copy_children(session, copied_session)
-
-    # Reload with relations for return
-    copied_session = db.query(SessionModel).options(
-        joinedload(SessionModel.session_criteria_assoc).joinedload(SessionCriterion.criterion),
-        joinedload(SessionModel.children)
-    ).filter(SessionModel.id == copied_session.id).first()
-
-    return session_to_dict(copied_session)
+    return (await db.run_sync(load_session_tree, [copied_id]))[0]
 
 @router.get("/{session_id}/criteria/averages")
-def get_criterion_averages(session_id: int, db: Session = Depends(get_db)):
+async def get_criterion_averages(session_id: int, db: AsyncSession = Depends(get_async_read_db)):
     """
     Returns average count_value for each countable criterion in a session.
     """
-    results = (
-        db.query(
+    results = (await db.execute(
+        select(
             UserCriterion.criterion_id,
             func.avg(UserCriterion.count_value).label("average_value")
         )
         .join(Criterion)
-        .filter(
+        .where(
             UserCriterion.session_id == session_id,
             Criterion.type == "countable"
         )
         .group_by(UserCriterion.criterion_id)
-        .all()
-    )
+    )).all()
 
     # Get criterion names too
     averages = []
     for criterion_id, avg_value in results:
-        criterion = db.query(Criterion).filter_by(id=criterion_id).first()
+        criterion = await db.get(Criterion, criterion_id)
         averages.append({
             "criterion_id": criterion_id,
             "criterion_name": criterion.name,
@@ -294,8 +377,25 @@ def get_criterion_averages(session_id: int, db: Session = Depends(get_db)):
     return averages
 
 
+# Read from the primary: a lagging replica would refill the weight cache with stale weights
+@router.get("/{session_id}/scores")
+async def get_session_scores(session_id: int, include_children: bool = False, db: AsyncSession = Depends(get_async_db)):
+    """
+    Returns the weighted score of every user in a session, optionally
+    including all of its subsessions.
+    """
+    if not await db.get(SessionModel, session_id):
+        raise HTTPException(status_code=404, detail="Session not found")
+
+    session_ids = [session_id]
+    if include_children:
+        tree = session_subtree_cte([session_id])
+        session_ids = (await db.scalars(select(tree.c.id))).all()
+
+    return await db.run_sync(compute_scores, session_ids)
 
-# --- UTIL: Recursive dict serializer ---
+
+# --- UTIL: dict serializer for a single tree node ---
 def session_to_dict(session: SessionModel) -> dict:
     return {
         "id": session.id,
@@ -304,13 +404,6 @@ def session_to_dict(session: SessionModel) -> dict:
         "parent_id": session.parent_id,
         "created_at": session.created_at,
         "updated_at": session.updated_at,
-        "criteria": [
-            {
-                "criterion": sc.criterion,
-                "role_id": sc.role_id,
-                "weight": sc.weight
-            }
-            for sc in session.session_criteria_assoc
-        ],
-        "children": [session_to_dict(child) for child in session.children]
+        "criteria": [],
+        "children": []
     }
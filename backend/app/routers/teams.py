@@ -1,46 +1,40 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session, joinedload
-from .. import db, models, schemas
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from .. import models, schemas
+from ..db import get_async_db, get_async_read_db
 
 router = APIRouter(prefix="/teams", tags=["teams"])
 
-# --- DB dependency ---
-def get_db():
-    db_sess = db.SessionLocal()
-    try:
-        yield db_sess
-    finally:
-        db_sess.close()
-
 
 # --- Create team ---
 @router.post("", response_model=schemas.TeamRead)
-def create_team(team: schemas.TeamCreate, db: Session = Depends(get_db)):
-    existing_team = db.query(models.Team).filter(models.Team.name == team.name).first()
+async def create_team(team: schemas.TeamCreate, db: AsyncSession = Depends(get_async_db)):
+    existing_team = await db.scalar(select(models.Team).where(models.Team.name == team.name))
     if existing_team:
         raise HTTPException(status_code=400, detail="Team already exists")
 
     new_team = models.Team(name=team.name)
     db.add(new_team)
-    db.commit()
-    db.refresh(new_team)
+    await db.commit()
+    await db.refresh(new_team)
     return new_team
 
 
 # --- Get all teams ---
 @router.get("", response_model=list[schemas.TeamRead])
-def get_teams(db: Session = Depends(get_db)):
-    return db.query(models.Team).all()
+async def get_teams(db: AsyncSession = Depends(get_async_read_db)):
+    return (await db.scalars(select(models.Team))).all()
 
 
 # --- Get single team with users ---
 @router.get("/{team_id}", response_model=schemas.TeamRead)
-def get_team(team_id: int, db: Session = Depends(get_db)):
-    team = (
-        db.query(models.Team)
-        .options(joinedload(models.Team.users))
-        .filter(models.Team.id == team_id)
-        .first()
+async def get_team(team_id: int, db: AsyncSession = Depends(get_async_read_db)):
+    team = await db.scalar(
+        select(models.Team)
+        .options(selectinload(models.Team.users))
+        .where(models.Team.id == team_id)
     )
     if not team:
         raise HTTPException(status_code=404, detail="Team not found")
@@ -49,41 +43,41 @@ def get_team(team_id: int, db: Session = Depends(get_db)):
 
 # --- Update team name ---
 @router.put("/{team_id}", response_model=schemas.TeamRead)
-def update_team(team_id: int, updated_team: schemas.TeamCreate, db: Session = Depends(get_db)):
-    team = db.query(models.Team).filter(models.Team.id == team_id).first()
+async def update_team(team_id: int, updated_team: schemas.TeamCreate, db: AsyncSession = Depends(get_async_db)):
+    team = await db.get(models.Team, team_id)
     if not team:
         raise HTTPException(status_code=404, detail="Team not found")
 
     team.name = updated_team.name
-    db.commit()
-    db.refresh(team)
+    await db.commit()
+    await db.refresh(team)
     return team
 
 
 # --- Delete team ---
 @router.delete("/{team_id}", response_model=dict)
-def delete_team(team_id: int, db: Session = Depends(get_db)):
-    team = db.query(models.Team).filter(models.Team.id == team_id).first()
+async def delete_team(team_id: int, db: AsyncSession = Depends(get_async_db)):
+    team = await db.get(models.Team, team_id)
     if not team:
         raise HTTPException(status_code=404, detail="Team not found")
 
-    db.delete(team)
-    db.commit()
+    await db.delete(team)
+    await db.commit()
     return {"status": "success", "message": f"Team {team_id} deleted"}
 
 
 # --- Assign a user to a team ---
 @router.put("/{team_id}/assign_user/{user_id}", response_model=schemas.UserRead)
-def assign_user_to_team(team_id: int, user_id: int, db: Session = Depends(get_db)):
-    team = db.query(models.Team).filter(models.Team.id == team_id).first()
+async def assign_user_to_team(team_id: int, user_id: int, db: AsyncSession = Depends(get_async_db)):
+    team = await db.get(models.Team, team_id)
     if not team:
         raise HTTPException(status_code=404, detail="Team not found")
 
-    user = db.query(models.User).filter(models.User.id == user_id).first()
+    user = await db.get(models.User, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
     user.team_id = team_id
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user, ["team"])
     return user
@@ -1,24 +1,22 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session, joinedload
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 from typing import List, Optional
-from .. import db, schemas, security, models
+from .. import schemas, security, models
+from ..db import get_async_db, get_async_read_db
+from ..counters import counter_buffer
+from .sessions import create_user_criteria_for_sessions, session_subtree_cte
 
 router = APIRouter(prefix="/users", tags=["users"])
 
-# --- DB dependency ---
-def get_db():
-    db_sess = db.SessionLocal()
-    try:
-        yield db_sess
-    finally:
-        db_sess.close()
-
 
 # --- Create user ---
 @router.post("", response_model=schemas.UserRead)
-def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
+async def create_user(user: schemas.UserCreate, db: AsyncSession = Depends(get_async_db)):
     # Check if email already exists
-    existing_user = db.query(models.User).filter(models.User.email == user.email).first()
+    existing_user = await db.scalar(select(models.User).where(models.User.email == user.email))
     if existing_user:
         raise HTTPException(status_code=400, detail="Email already registered")
 
@@ -28,52 +26,32 @@ def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
         last_name=user.last_name,
         team_id=user.team_id,
         email=user.email,
-        password_hash=security.hash_password(user.password)
+        password_hash=await run_in_threadpool(security.hash_password, user.password)
     )
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.flush()
 
     # Initialize user criteria for all sessions and subsessions
-    sessions = db.query(models.Session).filter(models.Session.parent_id == None).all()
-    def create_user_criteria_for_all_sessions(sessions):
-        for sess in sessions:
-            for crit in sess.criteria:
-                exists = db.query(models.UserCriterion).filter_by(
-                    user_id=new_user.id,
-                    criterion_id=crit.id,
-                    session_id=sess.id
-                ).first()
-                if not exists:
-                    uc = models.UserCriterion(
-                        user_id=new_user.id,
-                        criterion_id=crit.id,
-                        session_id=sess.id
-                    )
-                    db.add(uc)
-                    db.commit()
-            if sess.children:
-                create_user_criteria_for_all_sessions(sess.children)
-
-    create_user_criteria_for_all_sessions(sessions)
-    db.commit()
+    await db.run_sync(create_user_criteria_for_sessions, user_ids=[new_user.id])
+    await db.commit()
+    await db.refresh(new_user, ["team"])
 
     return new_user
 
 
 # --- Get all users ---
 @router.get("", response_model=List[schemas.UserRead])
-def get_users(team_id: Optional[int] = None, db: Session = Depends(get_db)):
-    query = db.query(models.User)
+async def get_users(team_id: Optional[int] = None, db: AsyncSession = Depends(get_async_read_db)):
+    query = select(models.User).options(selectinload(models.User.team))
     if team_id:
-        query = query.filter(models.User.team_id == team_id)
-    return query.all()
+        query = query.where(models.User.team_id == team_id)
+    return (await db.scalars(query)).all()
 
 
 # --- Get single user ---
 @router.get("/{user_id}", response_model=schemas.UserRead)
-def get_user(user_id: int, session: Session = Depends(get_db)):
-    user = session.query(models.User).filter(models.User.id == user_id).first()
+async def get_user(user_id: int, session: AsyncSession = Depends(get_async_read_db)):
+    user = await session.get(models.User, user_id, options=[selectinload(models.User.team)])
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     return user
@@ -81,56 +59,112 @@ def get_user(user_id: int, session: Session = Depends(get_db)):
 
 # --- Get user evaluation ---
 @router.get("/{user_id}/evaluation")
-def get_user_evaluation(user_id: int, db: Session = Depends(get_db)):
-    sessions = (
-        db.query(models.Session)
-        .options(
-            joinedload(models.Session.children),
-            joinedload(models.Session.criteria),
-            joinedload(models.Session.user_criteria).joinedload(models.UserCriterion.criterion)
+async def get_user_evaluation(user_id: int, db: AsyncSession = Depends(get_async_read_db)):
+    tree = session_subtree_cte()
+    tree_ids = select(tree.c.id)
+
+    sessions = (await db.execute(
+        select(
+            models.Session.id,
+            models.Session.parent_id,
+            models.Session.title,
+            models.Session.description,
+            tree.c.depth
+        )
+        .join(tree, tree.c.id == models.Session.id)
+        .order_by(tree.c.depth, models.Session.id)
+    )).all()
+
+    async def load():
+        return (await db.execute(
+            select(
+                models.UserCriterion.id,
+                models.UserCriterion.session_id,
+                models.UserCriterion.count_value,
+                models.UserCriterion.is_fulfilled,
+                models.Criterion.id.label("criterion_id"),
+                models.Criterion.name,
+                models.Criterion.type
+            )
+            .join(models.Criterion, models.Criterion.id == models.UserCriterion.criterion_id)
+            .where(models.UserCriterion.user_id == user_id, models.UserCriterion.session_id.in_(tree_ids))
+            .order_by(models.UserCriterion.id)
+        )).all()
+
+    if counter_buffer.enabled:
+        user_criteria, counts = await counter_buffer.read_merged(
+            load, lambda rows: {(user_id, uc.criterion_id, uc.session_id): uc.count_value for uc in rows}
+        )
+    else:
+        user_criteria = await load()
+        counts = {(user_id, uc.criterion_id, uc.session_id): uc.count_value for uc in user_criteria}
+
+    texts = {}
+    for t in await db.execute(
+        select(
+            models.UserCriterionText.id,
+            models.UserCriterionText.user_criterion_id,
+            models.UserCriterionText.text_value,
+            models.UserCriterionText.is_active,
+            models.UserCriterionText.created_at
+        )
+        .join(models.UserCriterion, models.UserCriterion.id == models.UserCriterionText.user_criterion_id)
+        .where(models.UserCriterion.user_id == user_id)
+        .order_by(models.UserCriterionText.created_at.desc())
+    ):
+        texts.setdefault(t.user_criterion_id, []).append(dict(t._mapping))
+
+    role_weights = {}
+    for sc in await db.execute(
+        select(
+            models.SessionCriterion.session_id,
+            models.SessionCriterion.criterion_id,
+            models.SessionCriterion.role_id,
+            models.SessionCriterion.weight
+        )
+        .where(models.SessionCriterion.session_id.in_(tree_ids))
+    ):
+        role_weights.setdefault((sc.session_id, sc.criterion_id), []).append(
+            {"role_id": sc.role_id, "weight": sc.weight}
         )
-        .filter(models.Session.parent_id == None)  # top-level sessions
-        .all()
-    )
 
-    def user_session_dict(session: models.Session):
-        return {
-            "id": session.id,
-            "title": session.title,
-            "description": session.description,
-            "userCriteria": [
-                {
-                    "id": uc.id,
-                    "count_value": uc.count_value,
-                    "is_fulfilled": uc.is_fulfilled,
-                    "text_value": uc.text_values,
-                    "criterion": {
-                        "id": uc.criterion.id,
-                        "name": uc.criterion.name,
-                        "type": uc.criterion.type.value,
-                        "role_weights": [
-                            {
-                                "role_id": assoc.role_id,
-                                "weight": assoc.weight
-                            }
-                            for assoc in session.session_criteria_assoc
-                            if assoc.criterion_id == uc.criterion.id
-                        ],
-                    },
-                }
-                for uc in session.user_criteria
-                if uc.user_id == user_id
-            ],
-            "children": [user_session_dict(child) for child in session.children]
+    nodes = {}
+    roots = []
+    for sess in sessions:
+        node = {
+            "id": sess.id,
+            "title": sess.title,
+            "description": sess.description,
+            "userCriteria": [],
+            "children": []
         }
-
-    return [user_session_dict(sess) for sess in sessions]
+        nodes[sess.id] = node
+        if sess.depth == 0:
+            roots.append(node)
+        else:
+            nodes[sess.parent_id]["children"].append(node)
+
+    for uc in user_criteria:
+        nodes[uc.session_id]["userCriteria"].append({
+            "id": uc.id,
+            "count_value": counts[(user_id, uc.criterion_id, uc.session_id)],
+            "is_fulfilled": uc.is_fulfilled,
+            "text_value": texts.get(uc.id, []),
+            "criterion": {
+                "id": uc.criterion_id,
+                "name": uc.name,
+                "type": uc.type.value,
+                "role_weights": role_weights.get((uc.session_id, uc.criterion_id), []),
+            },
+        })
+
+    return roots
 
 
 # --- Update user ---
 @router.put("/{user_id}", response_model=schemas.UserRead)
-def update_user(user_id: int, updated_user: schemas.UserUpdate, session: Session = Depends(get_db)):
-    user = session.query(models.User).filter(models.User.id == user_id).first()
+async def update_user(user_id: int, updated_user: schemas.UserUpdate, session: AsyncSession = Depends(get_async_db)):
+    user = await session.get(models.User, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
@@ -139,17 +173,17 @@ def update_user(user_id: int, updated_user: schemas.UserUpdate, session: Session
     user.team_id = updated_user.team_id
     user.email = updated_user.email
     
-    session.commit()
-    session.refresh(user)
+    await session.commit()
+    await session.refresh(user, ["team"])
     return user
 
 
 # --- Delete user ---
 @router.delete("/{user_id}", response_model=dict)
-def delete_user(user_id: int, session: Session = Depends(get_db)):
-    user = session.query(models.User).filter(models.User.id == user_id).first()
+async def delete_user(user_id: int, session: AsyncSession = Depends(get_async_db)):
+    user = await session.get(models.User, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
-    session.delete(user)
-    session.commit()
+    await session.delete(user)
+    await session.commit()
     return {"status": "success", "message": f"User {user_id} deleted"}
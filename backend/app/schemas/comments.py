@@ -1,4 +1,5 @@
 from pydantic import BaseModel
+from datetime import datetime
 
 class CommentCreateRequest(BaseModel):
     text: str
@@ -8,8 +9,8 @@ class CommentResponse(BaseModel):
     user_id: int
     session_id: int
     text: str
-    created_at: str
-    updated_at: str
+    created_at: datetime
+    updated_at: datetime
 
     class Config:
         orm_mode = True
\ No newline at end of file
@@ -1,6 +1,7 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from enum import Enum
 from typing import Optional, Union, List
+from datetime import datetime
 from .users import UserRead
 
 
@@ -50,7 +51,7 @@ class CriterionWithWeightCreate(BaseModel):
 class UserCriterionTextRead(BaseModel):
     text_value: str
     is_active: bool
-    created_at: str
+    created_at: datetime
 
     class Config:
         orm_mode = True
@@ -88,3 +89,24 @@ class UserCriterionRead(UserCriterionBase):
 
 class UserCriterionUpdate(BaseModel):
     value: Optional[Union[str, bool, int]] = None
+
+
+class UpdateAction(str, Enum):
+    increment = "increment"
+    decrement = "decrement"
+    set_boolean = "set_boolean"
+    set_text = "set_text"
+
+
+class UserCriterionOperation(BaseModel):
+    criterion_id: int
+    user_id: int
+    session_id: int
+    action: UpdateAction
+    delta: int = Field(1, ge=1)
+    value: Optional[Union[str, bool, int]] = None
+
+
+class UserCriterionBatch(BaseModel):
+    operations: List[UserCriterionOperation]
+
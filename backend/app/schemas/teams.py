@@ -1,4 +1,5 @@
 from pydantic import BaseModel, EmailStr
+from datetime import datetime
 
 # --- Team Schemas ---
 class TeamBase(BaseModel):
@@ -11,7 +12,7 @@ class TeamCreate(TeamBase):
 
 class TeamRead(TeamBase):
     id: int
-    created_at: str
+    created_at: datetime
 
     class Config:
         orm_mode = True
\ No newline at end of file
@@ -0,0 +1,102 @@
+import numpy as np
+from typing import List
+from sqlalchemy import select, case
+from sqlalchemy.orm import Session
+
+from .models import Criterion, UserCriterion
+from .models.criterias import CriterionType
+from .weights import weight_cache, DEFAULT_WEIGHT
+
+
+def compute_scores(db: Session, session_ids: List[int]) -> List[dict]:
+    """
+    Compute weighted scores for every user in the given sessions.
+
+    A criterion contributes count_value (countable) or 1/0 (boolean) times
+    its effective weight: the weight for the user's role in that session,
+    else 1 (the same resolution as roles.get_effective_criterion_weight).
+    Counts are loaded with one query, role assignments and weights come
+    from the weight cache, and all users are scored in one vectorized pass.
+    """
+    if not session_ids:
+        return []
+    session_ids = np.unique(np.asarray(session_ids, dtype=np.int64))
+
+    value = case(
+        (Criterion.type == CriterionType.countable, UserCriterion.count_value),
+        (Criterion.type == CriterionType.boolean, case((UserCriterion.is_fulfilled, 1), else_=0)),
+        else_=0
+    )
+    uc_rows = db.execute(
+        select(UserCriterion.user_id, UserCriterion.session_id, UserCriterion.criterion_id, value)
+        .join(Criterion, Criterion.id == UserCriterion.criterion_id)
+        .where(UserCriterion.session_id.in_(session_ids.tolist()))
+    ).all()
+    weights_by_session = weight_cache.get_many(db, session_ids.tolist())
+    sc_rows = [
+        (sid, criterion_id, role_id, weight)
+        for sid, sw in weights_by_session.items()
+        for (role_id, criterion_id), weight in sw.role_weights.items()
+    ]
+    role_rows = [
+        (user_id, sid, role_id)
+        for sid, sw in weights_by_session.items()
+        for user_id, role_id in sw.user_roles.items()
+    ]
+    if not uc_rows or not sc_rows:
+        return []
+
+    # --- Weight matrix: one row per role (row 0 = no role), one column per (session, criterion) ---
+    sc = np.array(sc_rows, dtype=np.float64)
+    sc_session = sc[:, 0].astype(np.int64)
+    sc_criterion = sc[:, 1].astype(np.int64)
+    sc_role = sc[:, 2].astype(np.int64)
+
+    slot_keys, sc_slot = np.unique((sc_session << 32) | sc_criterion, return_inverse=True)
+    slot_session = np.searchsorted(session_ids, slot_keys >> 32)
+
+    usr = np.array(role_rows, dtype=np.int64).reshape(-1, 3)
+    role_ids = np.unique(np.concatenate([sc_role, usr[:, 2]]))
+    weights = np.full((len(role_ids) + 1, len(slot_keys)), DEFAULT_WEIGHT)
+    weights[np.searchsorted(role_ids, sc_role) + 1, sc_slot] = sc[:, 3]
+
+    # --- Per-row values mapped onto users and (session, criterion) slots ---
+    uc = np.array(uc_rows, dtype=np.float64)
+    uc_keys = (uc[:, 1].astype(np.int64) << 32) | uc[:, 2].astype(np.int64)
+    uc_slot = np.searchsorted(slot_keys, uc_keys).clip(max=len(slot_keys) - 1)
+    known = slot_keys[uc_slot] == uc_keys
+    uc, uc_slot = uc[known], uc_slot[known]
+    if not len(uc):
+        return []
+    user_ids, uc_user = np.unique(uc[:, 0].astype(np.int64), return_inverse=True)
+
+    # --- Role of each user in each session (0 = no role) ---
+    user_roles = np.zeros((len(user_ids), len(session_ids)), dtype=np.int64)
+    if len(usr):
+        usr_user = np.searchsorted(user_ids, usr[:, 0]).clip(max=len(user_ids) - 1)
+        assigned = user_ids[usr_user] == usr[:, 0]
+        user_roles[usr_user[assigned], np.searchsorted(session_ids, usr[assigned, 1])] = (
+            np.searchsorted(role_ids, usr[assigned, 2]) + 1
+        )
+
+    # --- Effective weights and scores ---
+    uc_session = slot_session[uc_slot]
+    w = weights[user_roles[uc_user, uc_session], uc_slot]
+    scores = np.bincount(
+        uc_user * len(session_ids) + uc_session,
+        weights=uc[:, 3] * w,
+        minlength=len(user_ids) * len(session_ids)
+    ).reshape(len(user_ids), len(session_ids))
+    totals = scores.sum(axis=1)
+
+    return [
+        {
+            "user_id": int(user_id),
+            "score": round(float(totals[i]), 2),
+            "sessions": [
+                {"session_id": int(session_id), "score": round(float(scores[i, j]), 2)}
+                for j, session_id in enumerate(session_ids)
+            ]
+        }
+        for i, user_id in enumerate(user_ids)
+    ]
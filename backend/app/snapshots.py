@@ -0,0 +1,126 @@
+import json
+import logging
+import zipfile
+from datetime import datetime, timezone
+from typing import List, Optional
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+from . import models
+from .importer import SEQUENCE_RESETS
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FORMAT = "bewertungsapp-snapshot"
+SNAPSHOT_VERSION = 1
+MANIFEST_NAME = "manifest.json"
+
+# Tables in dependency order: restore copies them in this order
+SNAPSHOT_MODELS = [
+    models.Team,
+    models.Role,
+    models.User,
+    models.Criterion,
+    models.Session,
+    models.SessionCriterion,
+    models.UserCriterion,
+    models.UserCriterionText,
+    models.UserSessionComment,
+    models.UserSessionRole,
+]
+
+
+class SnapshotError(Exception):
+    """The archive is not a snapshot that can be restored into this database."""
+
+
+def quote_columns(columns: List[str]) -> str:
+    return ", ".join(f'"{column}"' for column in columns)
+
+
+def schema_revision(conn: Connection) -> Optional[str]:
+    try:
+        with conn.begin_nested():
+            return conn.execute(text("SELECT version_num FROM alembic_version")).scalar()
+    except Exception:
+        return None
+
+
+def write_snapshot(conn: Connection, fh):
+    """
+    Dump all tables with COPY ... TO STDOUT (FORMAT binary) into a zip
+    archive with one member per table and a manifest. conn should be in a
+    REPEATABLE READ transaction so that all tables come from one snapshot.
+    """
+    cursor = conn.connection.cursor()
+    tables = []
+    with zipfile.ZipFile(fh, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for model in SNAPSHOT_MODELS:
+            table = model.__table__
+            columns = [column.name for column in table.columns]
+            member = f"{table.name}.copy"
+            with archive.open(member, "w") as out:
+                cursor.copy_expert(
+                    f'COPY "{table.name}" ({quote_columns(columns)}) TO STDOUT (FORMAT binary)', out
+                )
+            tables.append({"name": table.name, "file": member, "columns": columns, "rows": cursor.rowcount})
+        manifest = {
+            "format": SNAPSHOT_FORMAT,
+            "version": SNAPSHOT_VERSION,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "schema_revision": schema_revision(conn),
+            "tables": tables,
+        }
+        archive.writestr(MANIFEST_NAME, json.dumps(manifest, indent=2))
+    return manifest
+
+
+def read_manifest(archive: zipfile.ZipFile) -> dict:
+    try:
+        manifest = json.loads(archive.read(MANIFEST_NAME))
+    except (KeyError, ValueError):
+        raise SnapshotError("Archive has no valid manifest")
+    if manifest.get("format") != SNAPSHOT_FORMAT or manifest.get("version") != SNAPSHOT_VERSION:
+        raise SnapshotError("Unsupported snapshot format")
+    return manifest
+
+
+def restore_snapshot(conn: Connection, fh) -> dict:
+    """
+    Replace the contents of all tables with a snapshot: TRUNCATE, then
+    COPY ... FROM STDIN (FORMAT binary) per table in dependency order, then
+    reset the id sequences. Runs in the caller's transaction; the caller
+    commits, so a failed restore leaves the database unchanged.
+    """
+    with zipfile.ZipFile(fh) as archive:
+        manifest = read_manifest(archive)
+        revision = schema_revision(conn)
+        if manifest.get("schema_revision") and revision and manifest["schema_revision"] != revision:
+            raise SnapshotError(
+                f"Snapshot schema revision {manifest['schema_revision']} does not match database revision {revision}"
+            )
+
+        entries = {entry["name"]: entry for entry in manifest["tables"]}
+        for model in SNAPSHOT_MODELS:
+            table = model.__table__
+            entry = entries.get(table.name)
+            if entry is None:
+                raise SnapshotError(f"Snapshot is missing table {table.name}")
+            if entry["columns"] != [column.name for column in table.columns]:
+                raise SnapshotError(f"Columns of table {table.name} do not match the snapshot")
+
+        table_names = ", ".join(f'"{model.__table__.name}"' for model in SNAPSHOT_MODELS)
+        conn.execute(text(f"TRUNCATE {table_names}"))
+
+        cursor = conn.connection.cursor()
+        for model in SNAPSHOT_MODELS:
+            entry = entries[model.__table__.name]
+            with archive.open(entry["file"]) as data:
+                cursor.copy_expert(
+                    f'COPY "{entry["name"]}" ({quote_columns(entry["columns"])}) FROM STDIN (FORMAT binary)', data
+                )
+
+    for table, seq in SEQUENCE_RESETS:
+        conn.execute(text(f"SELECT setval('{seq}', (SELECT COALESCE(MAX(id), 0) + 1 FROM {table}), false)"))
+    logger.info("Restored snapshot from %s", manifest["created_at"])
+    return manifest
@@ -0,0 +1,112 @@
+import time
+import threading
+from typing import Dict, Iterable, List, Optional
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from .models import SessionCriterion, UserSessionRole
+
+DEFAULT_WEIGHT = 1.0
+
+
+class SessionWeights:
+    """
+    Resolved criterion weights of one session.
+
+    role_weights maps (role_id, criterion_id) -> weight and user_roles maps
+    user_id -> role_id of the users that have a role in this session. Every
+    session criterion entry has a role (role_id is part of its primary key),
+    so users without a role, or whose role has no entry for a criterion,
+    get DEFAULT_WEIGHT.
+    """
+
+    def __init__(self, session_id: int):
+        self.session_id = session_id
+        self.role_weights: Dict[tuple, float] = {}
+        self.user_roles: Dict[int, int] = {}
+        self.loaded_at = time.monotonic()
+
+    @property
+    def criterion_ids(self) -> List[int]:
+        return sorted({c for _, c in self.role_weights})
+
+    def weight(self, role_id: Optional[int], criterion_id: int) -> float:
+        """Role-specific weight, else 1."""
+        return self.role_weights.get((role_id, criterion_id), DEFAULT_WEIGHT)
+
+    def user_weight(self, user_id: int, criterion_id: int) -> float:
+        return self.weight(self.user_roles.get(user_id), criterion_id)
+
+
+class WeightCache:
+    """
+    Process-local cache of SessionWeights. Entries are dropped by
+    invalidate() on writes and expire after ttl seconds so that changes
+    made through other workers are picked up as well.
+    """
+
+    def __init__(self, ttl: float = 60):
+        self.ttl = ttl
+        self._entries: Dict[int, SessionWeights] = {}
+        self._lock = threading.Lock()
+
+    def get_many(self, db: Session, session_ids: Iterable[int]) -> Dict[int, SessionWeights]:
+        """Return SessionWeights for all sessions, loading misses with one query per table."""
+        session_ids = set(session_ids)
+        now = time.monotonic()
+        with self._lock:
+            result = {
+                sid: entry for sid, entry in self._entries.items()
+                if sid in session_ids and now - entry.loaded_at < self.ttl
+            }
+        missing = session_ids - set(result)
+        if not missing:
+            return result
+
+        loaded = {sid: SessionWeights(sid) for sid in missing}
+        for sid, criterion_id, role_id, weight in db.execute(
+            select(
+                SessionCriterion.session_id,
+                SessionCriterion.criterion_id,
+                SessionCriterion.role_id,
+                SessionCriterion.weight
+            ).where(SessionCriterion.session_id.in_(missing))
+        ):
+            loaded[sid].role_weights[(role_id, criterion_id)] = weight
+        for sid, user_id, role_id in db.execute(
+            select(UserSessionRole.session_id, UserSessionRole.user_id, UserSessionRole.role_id)
+            .where(UserSessionRole.session_id.in_(missing))
+        ):
+            loaded[sid].user_roles[user_id] = role_id
+
+        with self._lock:
+            self._entries.update(loaded)
+        result.update(loaded)
+        return result
+
+    def get(self, db: Session, session_id: int) -> SessionWeights:
+        return self.get_many(db, [session_id])[session_id]
+
+    def invalidate(self, session_ids: Optional[Iterable[int]] = None):
+        """Drop the given sessions, or everything when session_ids is None."""
+        with self._lock:
+            if session_ids is None:
+                self._entries.clear()
+            else:
+                for sid in session_ids:
+                    self._entries.pop(sid, None)
+
+
+weight_cache = WeightCache()
+
+
+def resolve_user_weights(
+    db: Session, session_id: int, user_ids: Iterable[int], criterion_ids: Optional[Iterable[int]] = None
+) -> Dict[int, Dict[int, float]]:
+    """Resolve user_id -> criterion_id -> effective weight for many users at once."""
+    weights = weight_cache.get(db, session_id)
+    criterion_ids = list(criterion_ids) if criterion_ids is not None else weights.criterion_ids
+    return {
+        user_id: {criterion_id: weights.user_weight(user_id, criterion_id) for criterion_id in criterion_ids}
+        for user_id in user_ids
+    }
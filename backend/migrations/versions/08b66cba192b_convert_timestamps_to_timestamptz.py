@@ -0,0 +1,192 @@
+"""convert timestamps to timestamptz
+
+Revision ID: 08b66cba192b
+Revises: b884d4337892
+Create Date: 2026-10-18 10:41:07.219644
+
+The ISO string columns are converted without rewriting the tables under
+a lock: a timestamptz shadow column is added and kept in sync by a
+trigger, existing rows are backfilled in batches of BACKFILL_BATCH_SIZE
+ids (each batch commits on its own), the indexes are built concurrently
+and finally the columns are swapped in one short transaction per table.
+Adding the shadow columns and swapping them also commit per table, so no
+two tables are ever locked together. The migration can be rerun after a
+failure: tables that were already swapped are skipped and every other
+step is idempotent.
+"""
+from contextlib import contextmanager
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '08b66cba192b'
+down_revision: Union[str, Sequence[str], None] = 'b884d4337892'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+BACKFILL_BATCH_SIZE = 10000
+
+# table -> timestamp columns
+TIMESTAMP_COLUMNS = {
+    'users': ['created_at', 'updated_at'],
+    'teams': ['created_at'],
+    'roles': ['created_at', 'updated_at'],
+    'criteria': ['created_at', 'updated_at'],
+    'sessions': ['created_at', 'updated_at'],
+    'user_criteria': ['created_at', 'updated_at'],
+    'user_criterion_texts': ['created_at'],
+    'user_session_roles': ['created_at', 'updated_at'],
+    'user_session_comments': ['created_at', 'updated_at'],
+    'deleted_rows': ['deleted_at'],
+}
+
+# Columns that are sorted or filtered by; the existing string indexes are replaced
+INDEXED_COLUMNS = [
+    ('users', 'updated_at'),
+    ('roles', 'updated_at'),
+    ('criteria', 'updated_at'),
+    ('sessions', 'updated_at'),
+    ('user_criteria', 'updated_at'),
+    ('user_criterion_texts', 'created_at'),
+    ('user_session_roles', 'updated_at'),
+    ('user_session_comments', 'created_at'),
+    ('user_session_comments', 'updated_at'),
+    ('deleted_rows', 'deleted_at'),
+]
+NEW_INDEXES = [('user_session_comments', 'created_at')]
+
+
+def parse_timestamp(value: str) -> str:
+    """SQL converting an ISO string to timestamptz; strings without an offset are UTC."""
+    return (
+        f"CASE WHEN {value} IS NULL OR {value} = '' THEN NULL "
+        f"WHEN {value} ~ '(Z|[+-][0-9]{{2}}(:?[0-9]{{2}})?)$' THEN {value}::timestamptz "
+        f"ELSE {value}::timestamp AT TIME ZONE 'UTC' END"
+    )
+
+
+def sync_function(table: str) -> str:
+    return f'sync_{table}_timestamptz'
+
+
+@contextmanager
+def table_transaction():
+    """
+    Explicit transaction inside the autocommit block, so that every table is
+    locked only for its own short step and never together with the others.
+    """
+    op.execute('BEGIN')
+    try:
+        yield
+    except Exception:
+        op.execute('ROLLBACK')
+        raise
+    op.execute('COMMIT')
+
+
+def drop_invalid_index(conn, name: str):
+    """Drop an index left INVALID by a failed concurrent build."""
+    invalid = conn.execute(
+        sa.text('SELECT NOT indisvalid FROM pg_index WHERE indexrelid = to_regclass(:name)'), {'name': name}
+    ).scalar()
+    if invalid:
+        op.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {name}')
+
+
+def is_swapped(conn, table: str) -> bool:
+    """True once step 4 converted the table; it swaps all columns of a table in one transaction."""
+    data_type = conn.execute(
+        sa.text(
+            'SELECT data_type FROM information_schema.columns '
+            'WHERE table_schema = current_schema() AND table_name = :table AND column_name = :column'
+        ),
+        {'table': table, 'column': TIMESTAMP_COLUMNS[table][0]}
+    ).scalar()
+    return data_type == 'timestamp with time zone'
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    conn = op.get_bind()
+
+    with op.get_context().autocommit_block():
+        pending_tables = {
+            table: columns for table, columns in TIMESTAMP_COLUMNS.items() if not is_swapped(conn, table)
+        }
+
+        # 1. Shadow columns, filled by a trigger for rows written during the migration
+        for table, columns in pending_tables.items():
+            with table_transaction():
+                for column in columns:
+                    op.execute(f'ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {column}_tz timestamptz')
+                assignments = ' '.join(
+                    f'NEW.{column}_tz := {parse_timestamp(f"NEW.{column}")};' for column in columns
+                )
+                op.execute(
+                    f'CREATE OR REPLACE FUNCTION {sync_function(table)}() RETURNS trigger AS $$ '
+                    f'BEGIN {assignments} RETURN NEW; END $$ LANGUAGE plpgsql'
+                )
+                op.execute(f'DROP TRIGGER IF EXISTS {sync_function(table)} ON {table}')
+                op.execute(
+                    f'CREATE TRIGGER {sync_function(table)} BEFORE INSERT OR UPDATE ON {table} '
+                    f'FOR EACH ROW EXECUTE FUNCTION {sync_function(table)}()'
+                )
+
+        # 2. Backfill in id ranges, one transaction per batch
+        for table, columns in pending_tables.items():
+            low, high = conn.execute(sa.text(f'SELECT MIN(id), MAX(id) FROM {table}')).one()
+            if low is None:
+                continue
+            assignments = ', '.join(f'{column}_tz = {parse_timestamp(column)}' for column in columns)
+            pending = ' OR '.join(f'({column}_tz IS NULL AND {column} IS NOT NULL)' for column in columns)
+            for start in range(low, high + 1, BACKFILL_BATCH_SIZE):
+                conn.execute(
+                    sa.text(f'UPDATE {table} SET {assignments} WHERE id >= :start AND id < :end AND ({pending})'),
+                    {'start': start, 'end': start + BACKFILL_BATCH_SIZE}
+                )
+
+        # 3. Indexes on the shadow columns, built without blocking writes
+        for table, column in INDEXED_COLUMNS:
+            if table not in pending_tables:
+                continue
+            drop_invalid_index(conn, f'ix_{table}_{column}_tz')
+            op.execute(f'CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_{table}_{column}_tz ON {table} ({column}_tz)')
+
+        # 4. Swap the columns, one transaction per table; dropping the string
+        # columns drops their indexes. The table is locked up front in the
+        # strongest mode the swap needs, so the lock is never upgraded.
+        for table, columns in pending_tables.items():
+            with table_transaction():
+                op.execute(f'LOCK TABLE {table} IN ACCESS EXCLUSIVE MODE')
+                assignments = ', '.join(f'{column}_tz = {parse_timestamp(column)}' for column in columns)
+                pending = ' OR '.join(f'({column}_tz IS NULL AND {column} IS NOT NULL)' for column in columns)
+                op.execute(f'UPDATE {table} SET {assignments} WHERE {pending}')
+                op.execute(f'DROP TRIGGER {sync_function(table)} ON {table}')
+                op.execute(f'DROP FUNCTION {sync_function(table)}()')
+                for column in columns:
+                    op.drop_column(table, column)
+                    op.alter_column(table, f'{column}_tz', new_column_name=column, server_default=sa.func.now())
+                for indexed_table, column in INDEXED_COLUMNS:
+                    if indexed_table == table:
+                        op.execute(f'ALTER INDEX ix_{table}_{column}_tz RENAME TO ix_{table}_{column}')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table, column in NEW_INDEXES:
+        op.drop_index(op.f(f'ix_{table}_{column}'), table_name=table)
+    for table, columns in TIMESTAMP_COLUMNS.items():
+        for column in columns:
+            op.alter_column(
+                table, column,
+                type_=sa.String(),
+                existing_type=sa.DateTime(timezone=True),
+                server_default=None,
+                postgresql_using=(
+                    f"to_char({column} AT TIME ZONE 'UTC', 'YYYY-MM-DD\"T\"HH24:MI:SS.US') || '+00:00'"
+                )
+            )
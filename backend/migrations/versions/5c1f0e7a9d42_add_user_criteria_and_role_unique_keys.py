@@ -0,0 +1,153 @@
+"""add user_criteria and user_session_roles unique keys
+
+Revision ID: 5c1f0e7a9d42
+Revises: 08b66cba192b
+Create Date: 2026-10-18 11:26:53.870412
+
+Duplicate rows are merged right before each unique index is built
+concurrently: user criteria are folded into their oldest row (counts
+summed, is_fulfilled OR-ed, texts moved over), user session roles keep
+their latest assignment. The running app can still insert a duplicate
+before the build starts, which leaves an INVALID index behind; such an
+index is dropped and merge and build are repeated. Finally the unique
+constraints are attached to their indexes. The migration can be rerun
+after a failure.
+"""
+from contextlib import contextmanager
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5c1f0e7a9d42'
+down_revision: Union[str, Sequence[str], None] = '08b66cba192b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+BUILD_ATTEMPTS = 3
+
+MERGE_USER_CRITERIA = [
+    # Rows sharing a key with a lower id; NULL sessions never conflict
+    """
+    CREATE TEMPORARY TABLE user_criteria_duplicates ON COMMIT DROP AS
+    SELECT id, keep_id FROM (
+        SELECT id, MIN(id) OVER (PARTITION BY user_id, session_id, criterion_id) AS keep_id
+        FROM user_criteria WHERE session_id IS NOT NULL
+    ) rows WHERE id <> keep_id
+    """,
+    """
+    UPDATE user_criteria u
+    SET count_value = u.count_value + m.count_value,
+        is_fulfilled = u.is_fulfilled OR m.is_fulfilled,
+        updated_at = GREATEST(u.updated_at, m.updated_at)
+    FROM (
+        SELECT d.keep_id, SUM(dup.count_value) AS count_value,
+               BOOL_OR(dup.is_fulfilled) AS is_fulfilled, MAX(dup.updated_at) AS updated_at
+        FROM user_criteria_duplicates d JOIN user_criteria dup ON dup.id = d.id
+        GROUP BY d.keep_id
+    ) m
+    WHERE u.id = m.keep_id
+    """,
+    """
+    UPDATE user_criterion_texts t SET user_criterion_id = d.keep_id
+    FROM user_criteria_duplicates d WHERE t.user_criterion_id = d.id
+    """,
+    # Only the newest active text of a merged row stays active
+    """
+    UPDATE user_criterion_texts t SET is_active = false
+    WHERE t.is_active
+      AND t.user_criterion_id IN (SELECT keep_id FROM user_criteria_duplicates)
+      AND t.id <> (
+          SELECT MAX(newest.id) FROM user_criterion_texts newest
+          WHERE newest.user_criterion_id = t.user_criterion_id AND newest.is_active
+      )
+    """,
+    'DELETE FROM user_criteria u USING user_criteria_duplicates d WHERE u.id = d.id',
+]
+
+MERGE_USER_SESSION_ROLES = [
+    # Keep the latest role assignment per user and session
+    """
+    DELETE FROM user_session_roles r USING user_session_roles newer
+    WHERE newer.user_id = r.user_id AND newer.session_id = r.session_id AND newer.id > r.id
+    """,
+]
+
+# name -> (table, columns, statements merging the duplicates)
+UNIQUE_CONSTRAINTS = {
+    'uq_user_criteria_user_session_criterion': (
+        'user_criteria', ['user_id', 'session_id', 'criterion_id'], MERGE_USER_CRITERIA
+    ),
+    'uq_user_session_roles_user_session': (
+        'user_session_roles', ['user_id', 'session_id'], MERGE_USER_SESSION_ROLES
+    ),
+}
+INDEXES = {
+    'ix_user_criteria_criterion_session': ('user_criteria', ['criterion_id', 'session_id']),
+    'ix_user_session_roles_session_user': ('user_session_roles', ['session_id', 'user_id']),
+}
+
+
+@contextmanager
+def transaction():
+    """Explicit transaction inside the autocommit block."""
+    op.execute('BEGIN')
+    try:
+        yield
+    except Exception:
+        op.execute('ROLLBACK')
+        raise
+    op.execute('COMMIT')
+
+
+def drop_invalid_index(conn, name: str):
+    """Drop an index left INVALID by a failed concurrent build."""
+    invalid = conn.execute(
+        sa.text('SELECT NOT indisvalid FROM pg_index WHERE indexrelid = to_regclass(:name)'), {'name': name}
+    ).scalar()
+    if invalid:
+        op.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {name}')
+
+
+def constraint_exists(conn, name: str) -> bool:
+    return conn.execute(sa.text('SELECT 1 FROM pg_constraint WHERE conname = :name'), {'name': name}).scalar() is not None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    conn = op.get_bind()
+
+    with op.get_context().autocommit_block():
+        for name, (table, columns, merge) in UNIQUE_CONSTRAINTS.items():
+            if constraint_exists(conn, name):
+                continue
+            for attempt in range(1, BUILD_ATTEMPTS + 1):
+                drop_invalid_index(conn, name)
+                with transaction():
+                    for statement in merge:
+                        op.execute(statement)
+                try:
+                    op.create_index(
+                        name, table, columns, unique=True, postgresql_concurrently=True, if_not_exists=True
+                    )
+                    break
+                except sa.exc.IntegrityError:
+                    # A duplicate was inserted after the merge
+                    if attempt == BUILD_ATTEMPTS:
+                        raise
+            op.execute(f'ALTER TABLE {table} ADD CONSTRAINT {name} UNIQUE USING INDEX {name}')
+
+        for name, (table, columns) in INDEXES.items():
+            drop_invalid_index(conn, name)
+            op.create_index(name, table, columns, postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for name, (table, columns) in INDEXES.items():
+        op.drop_index(name, table_name=table)
+    for name, (table, columns, merge) in UNIQUE_CONSTRAINTS.items():
+        op.drop_constraint(name, table, type_='unique')
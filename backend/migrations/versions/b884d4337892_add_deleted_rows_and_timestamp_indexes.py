@@ -0,0 +1,56 @@
+"""add deleted_rows and timestamp indexes
+
+Revision ID: b884d4337892
+Revises: 302451e5419f
+Create Date: 2026-10-18 09:12:41.503217
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b884d4337892'
+down_revision: Union[str, Sequence[str], None] = '302451e5419f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+TIMESTAMP_INDEXES = [
+    ('users', 'updated_at'),
+    ('roles', 'updated_at'),
+    ('criteria', 'updated_at'),
+    ('sessions', 'updated_at'),
+    ('user_criteria', 'updated_at'),
+    ('user_session_roles', 'updated_at'),
+    ('user_session_comments', 'updated_at'),
+    ('user_criterion_texts', 'created_at'),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('deleted_rows',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('table_name', sa.String(), nullable=False),
+    sa.Column('row_key', sa.String(), nullable=False),
+    sa.Column('deleted_at', sa.String(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_deleted_rows_id'), 'deleted_rows', ['id'], unique=False)
+    op.create_index(op.f('ix_deleted_rows_deleted_at'), 'deleted_rows', ['deleted_at'], unique=False)
+
+    for table, column in TIMESTAMP_INDEXES:
+        op.create_index(op.f(f'ix_{table}_{column}'), table, [column], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table, column in TIMESTAMP_INDEXES:
+        op.drop_index(op.f(f'ix_{table}_{column}'), table_name=table)
+
+    op.drop_index(op.f('ix_deleted_rows_deleted_at'), table_name='deleted_rows')
+    op.drop_index(op.f('ix_deleted_rows_id'), table_name='deleted_rows')
+    op.drop_table('deleted_rows')
@@ -0,0 +1,74 @@
+import os
+import tempfile
+
+# The engines are created when app.db is imported, so configure them first
+TEST_DIR = tempfile.mkdtemp(prefix="bewertungsapp-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(TEST_DIR, 'test.db')}"
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import db, models
+from app.main import app
+from app.counters import counter_buffer
+from app.export_cache import export_cache
+from app.weights import weight_cache
+
+
+@pytest.fixture(autouse=True)
+def clean_state(tmp_path, monkeypatch):
+    """Fresh tables, caches and counter buffer for every test."""
+    monkeypatch.setattr(export_cache, "directory", str(tmp_path / "exports"))
+    models.Base.metadata.drop_all(bind=db.engine)
+    models.Base.metadata.create_all(bind=db.engine)
+    weight_cache.invalidate()
+    counter_buffer.enabled = False
+    counter_buffer._pending = {}
+    counter_buffer._ops = 0
+    yield
+
+
+@pytest.fixture
+def client():
+    return TestClient(app)
+
+
+@pytest.fixture
+def session():
+    with db.SessionLocal() as s:
+        yield s
+
+
+@pytest.fixture
+def cache_dir(tmp_path):
+    return tmp_path / "exports"
+
+
+@pytest.fixture
+def seeded(client, session):
+    """
+    Two roles, three users, a countable, a boolean and a text criterion and
+    one session using all of them. Returns the ids.
+    """
+    session.add_all([models.Role(id=1, name="lead"), models.Role(id=2, name="member")])
+    session.commit()
+    users = []
+    for i in range(3):
+        r = client.post("/users", json={
+            "first_name": f"First{i}", "last_name": f"Last{i}", "email": f"user{i}@example.com", "password": "pw"
+        })
+        assert r.status_code == 200, r.text
+        users.append(r.json()["id"])
+    criteria = {}
+    for name, type_ in [("points", "countable"), ("present", "boolean"), ("notes", "text")]:
+        r = client.post("/criteria", json={"name": name, "type": type_})
+        assert r.status_code == 200, r.text
+        criteria[name] = r.json()["id"]
+    r = client.post("/sessions", json={"title": "Session", "criteria": [
+        {"id": criteria["points"], "role_id": 1, "weight": 2},
+        {"id": criteria["points"], "role_id": 2, "weight": 1},
+        {"id": criteria["present"], "role_id": 1, "weight": 1},
+        {"id": criteria["notes"], "role_id": 1, "weight": 1},
+    ]})
+    assert r.status_code == 200, r.text
+    return {"users": users, "criteria": criteria, "session": r.json()["id"]}
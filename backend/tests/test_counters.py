@@ -0,0 +1,93 @@
+import asyncio
+import threading
+
+from sqlalchemy import select
+
+from app import db, models
+from app.counters import counter_buffer
+
+
+def stored_count(seeded, user=0, criterion="points"):
+    with db.SessionLocal() as s:
+        return s.scalar(
+            select(models.UserCriterion.count_value)
+            .filter_by(user_id=seeded["users"][user], criterion_id=seeded["criteria"][criterion], session_id=seeded["session"])
+        )
+
+
+def key(seeded, user=0, criterion="points"):
+    return (seeded["users"][user], seeded["criteria"][criterion], seeded["session"])
+
+
+def read(seeded, load=None):
+    async def default_load():
+        return stored_count(seeded)
+
+    _, counts = asyncio.run(counter_buffer.read_merged(load or default_load, lambda count: {key(seeded): count}))
+    return counts[key(seeded)]
+
+
+def test_single_updates_are_buffered_until_flush(client, seeded):
+    counter_buffer.enabled = True
+    url = f"/criteria/{seeded['criteria']['points']}/{seeded['users'][0]}/session/{seeded['session']}"
+    for action in ["increment", "increment", "decrement", "decrement", "decrement", "increment"]:
+        r = client.put(url, params={"action": action})
+    assert r.json()["count_value"] == 1
+    assert stored_count(seeded) == 0
+
+    assert counter_buffer.flush() == 1
+    assert stored_count(seeded) == 1
+    assert read(seeded) == 1
+
+
+def test_batch_buffers_only_countable_criteria(client, seeded):
+    counter_buffer.enabled = True
+    r = client.post("/criteria/batch", json={"operations": [
+        {
+            "user_id": seeded["users"][0], "criterion_id": seeded["criteria"][name],
+            "session_id": seeded["session"], "action": "increment", "delta": 2
+        }
+        for name in ["points", "present"]
+    ]})
+    assert r.status_code == 200
+    assert [uc["count_value"] for uc in r.json()] == [2, 2]
+    assert counter_buffer._pending == {key(seeded): 2}
+    assert stored_count(seeded, criterion="present") == 2
+
+
+def test_flush_committing_during_a_read_is_not_lost(seeded):
+    counter_buffer.enabled = True
+    counter_buffer.add(key(seeded), 3)
+    loads = []
+
+    async def load():
+        count = stored_count(seeded)
+        if not loads:
+            # The flush commits after the count was read
+            counter_buffer.flush()
+        loads.append(count)
+        return count
+
+    assert read(seeded, load) == 3
+    assert loads == [0, 3]
+
+
+def test_reads_concurrent_with_flushes_count_every_delta_once(seeded):
+    counter_buffer.enabled = True
+    stop = threading.Event()
+
+    def flush():
+        while not stop.is_set():
+            counter_buffer.flush()
+
+    flusher = threading.Thread(target=flush)
+    flusher.start()
+    try:
+        for added in range(1, 101):
+            counter_buffer.add(key(seeded), 1)
+            assert read(seeded) == added
+    finally:
+        stop.set()
+        flusher.join()
+    counter_buffer.flush()
+    assert stored_count(seeded) == 100
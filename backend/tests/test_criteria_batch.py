@@ -0,0 +1,99 @@
+from sqlalchemy import delete, event, select
+
+from app import db, models
+
+
+def batch(client, seeded, *operations, user=0, criterion="points"):
+    r = client.post("/criteria/batch", json={"operations": [
+        {
+            "user_id": seeded["users"][user],
+            "criterion_id": seeded["criteria"][criterion],
+            "session_id": seeded["session"],
+            **op
+        }
+        for op in operations
+    ]})
+    assert r.status_code == 200, r.text
+    return r.json()
+
+
+def count(client, seeded, user=0):
+    r = client.get(f"/criteria/user/{seeded['users'][user]}/session/{seeded['session']}")
+    return next(uc["count_value"] for uc in r.json() if uc["criterion"]["name"] == "points")
+
+
+def test_batch_applies_counter_operations_in_request_order(client, seeded):
+    rows = batch(client, seeded, {"action": "decrement"}, {"action": "increment"})
+    assert rows[0]["count_value"] == 1
+
+    rows = batch(
+        client, seeded,
+        {"action": "increment", "delta": 3}, {"action": "decrement", "delta": 5}, {"action": "increment", "delta": 2}
+    )
+    assert rows[0]["count_value"] == 2
+
+
+def test_batch_matches_single_requests(client, seeded):
+    actions = ["decrement", "increment", "increment", "decrement", "decrement", "decrement", "increment"]
+    batch(client, seeded, *[{"action": a} for a in actions], user=0)
+    for a in actions:
+        client.put(
+            f"/criteria/{seeded['criteria']['points']}/{seeded['users'][1]}/session/{seeded['session']}",
+            params={"action": a}
+        )
+    assert count(client, seeded, user=0) == count(client, seeded, user=1) == 1
+
+
+def test_batch_floors_decrements_at_zero(client, seeded):
+    rows = batch(client, seeded, {"action": "decrement", "delta": 5}, {"action": "decrement", "delta": 5})
+    assert rows[0]["count_value"] == 0
+
+
+def test_batch_creates_missing_rows(client, seeded, session):
+    session.execute(delete(models.UserCriterion).where(models.UserCriterion.session_id == seeded["session"]))
+    session.commit()
+
+    rows = batch(client, seeded, {"action": "increment", "delta": 2}, {"action": "increment"})
+    assert rows[0]["count_value"] == 3
+    assert session.scalar(
+        select(models.UserCriterion.count_value)
+        .filter_by(user_id=seeded["users"][0], criterion_id=seeded["criteria"]["points"], session_id=seeded["session"])
+    ) == 3
+
+
+def test_batch_stores_texts_in_order(client, seeded):
+    rows = batch(
+        client, seeded, {"action": "set_text", "value": "first"}, {"action": "set_text", "value": "second"},
+        criterion="notes"
+    )
+    assert rows[0]["active_text"] == "second"
+    assert rows[0]["last_texts"] == ["first"]
+
+
+def test_batch_rejects_unknown_criterion(client, seeded):
+    r = client.post("/criteria/batch", json={"operations": [{
+        "user_id": seeded["users"][0], "criterion_id": 999, "session_id": seeded["session"], "action": "increment"
+    }]})
+    assert r.status_code == 404
+
+
+def test_batch_locks_counters_in_id_order(client, seeded):
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.async_engine.sync_engine, "before_cursor_execute", record)
+    try:
+        r = client.post("/criteria/batch", json={"operations": [
+            {
+                "user_id": user, "criterion_id": seeded["criteria"]["points"],
+                "session_id": seeded["session"], "action": "increment"
+            }
+            for user in reversed(seeded["users"])
+        ]})
+    finally:
+        event.remove(db.async_engine.sync_engine, "before_cursor_execute", record)
+    assert r.status_code == 200
+    lock = next(s for s in statements if s.startswith("SELECT user_criteria.id, user_criteria.count_value"))
+    assert "ORDER BY user_criteria.id" in lock
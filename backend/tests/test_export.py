@@ -0,0 +1,52 @@
+import csv
+import io
+import zipfile
+
+import openpyxl
+import pyarrow.parquet as pq
+
+from app.routers import files
+
+
+def export(client, **params):
+    r = client.get("/files/export", params=params)
+    assert r.status_code == 200, r.text
+    return r
+
+
+def test_xlsx_export_has_a_sheet_per_table(client, seeded):
+    r = export(client)
+    assert r.headers["content-type"] == files.XLSX_MEDIA_TYPE
+    workbook = openpyxl.load_workbook(io.BytesIO(r.content), read_only=True)
+    assert "Users" in workbook.sheetnames and "UserCriteria" in workbook.sheetnames
+    emails = [row[3] for row in workbook["Users"].iter_rows(min_row=2, values_only=True)]
+    header = next(workbook["Users"].iter_rows(max_row=1, values_only=True))
+    assert header[3] == "email"
+    assert emails == ["user0@example.com", "user1@example.com", "user2@example.com"]
+
+
+def test_csv_and_parquet_exports_match_the_xlsx_tables(client, seeded):
+    workbook = openpyxl.load_workbook(io.BytesIO(export(client).content), read_only=True)
+    expected = {name: len(list(workbook[name].iter_rows(min_row=2))) for name in workbook.sheetnames}
+
+    with zipfile.ZipFile(io.BytesIO(export(client, format="csv.zip").content)) as archive:
+        rows = {
+            name.removesuffix(".csv"): len(list(csv.reader(io.TextIOWrapper(archive.open(name), encoding="utf-8")))) - 1
+            for name in archive.namelist()
+        }
+    assert rows == expected
+
+    with zipfile.ZipFile(io.BytesIO(export(client, format="parquet").content)) as archive:
+        rows = {
+            name.removesuffix(".parquet"): pq.read_table(io.BytesIO(archive.read(name))).num_rows
+            for name in archive.namelist()
+        }
+    assert rows == expected
+
+
+def test_xlsx_export_rejects_tables_past_the_row_limit(client, seeded, monkeypatch):
+    monkeypatch.setattr(files, "XLSX_MAX_ROWS", 3)
+    r = client.get("/files/export")
+    assert r.status_code == 400
+    assert "format=csv.zip" in r.json()["detail"]
+    assert client.get("/files/export", params={"format": "csv.zip"}).status_code == 200
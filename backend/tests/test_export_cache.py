@@ -0,0 +1,38 @@
+def export(client, **headers):
+    return client.get("/files/export", headers=headers)
+
+
+def test_unchanged_data_is_served_from_the_cache(client, seeded, cache_dir):
+    first = export(client)
+    assert first.status_code == 200
+    assert len(list(cache_dir.iterdir())) == 1
+
+    second = export(client)
+    assert second.headers["etag"] == first.headers["etag"]
+    assert second.content == first.content
+    assert len(list(cache_dir.iterdir())) == 1
+
+
+def test_matching_etag_returns_304(client, seeded, cache_dir):
+    etag = export(client).headers["etag"]
+    r = export(client, **{"If-None-Match": etag})
+    assert r.status_code == 304
+    assert r.headers["etag"] == etag
+    assert export(client, **{"If-None-Match": f'W/"other", {etag}'}).status_code == 304
+
+
+def test_formats_have_their_own_etags(client, seeded, cache_dir):
+    xlsx = export(client).headers["etag"]
+    csv = client.get("/files/export", params={"format": "csv.zip"}).headers["etag"]
+    assert xlsx != csv
+
+
+def test_writes_change_the_data_version(client, seeded, cache_dir):
+    etag = export(client).headers["etag"]
+    client.put(
+        f"/criteria/{seeded['criteria']['points']}/{seeded['users'][0]}/session/{seeded['session']}",
+        params={"action": "increment"}
+    )
+    r = export(client, **{"If-None-Match": etag})
+    assert r.status_code == 200
+    assert r.headers["etag"] != etag
@@ -0,0 +1,55 @@
+import io
+import json
+import time
+from datetime import datetime, timedelta, timezone
+
+import openpyxl
+
+from app.routers import files
+
+
+def delta(client, since):
+    r = client.get("/files/export", params={"since": since})
+    assert r.status_code == 200, r.text
+    workbook = openpyxl.load_workbook(io.BytesIO(r.content), read_only=True)
+    sheets = {name: list(workbook[name].iter_rows(min_row=2, values_only=True)) for name in workbook.sheetnames}
+    return r, sheets
+
+
+def test_delta_contains_only_rows_changed_since_the_cursor(client, seeded, monkeypatch):
+    monkeypatch.setattr(files, "EXPORT_CURSOR_OVERLAP_SECONDS", 0)
+    since = (datetime.now(timezone.utc) - timedelta(minutes=1)).isoformat()
+    # SQLite's clock has whole seconds, keep the seeded rows out of the next cursor
+    time.sleep(1.1)
+    r, sheets = delta(client, since)
+    assert len(sheets["Users"]) == 3
+    cursor = r.headers["x-export-cursor"]
+    assert datetime.fromisoformat(cursor).tzinfo is not None
+
+    r = client.put(f"/users/{seeded['users'][1]}", json={
+        "first_name": "Changed", "last_name": "Last1", "email": "user1@example.com", "team_id": None
+    })
+    assert r.status_code == 200, r.text
+    _, sheets = delta(client, cursor)
+    assert [row[0] for row in sheets["Users"]] == [seeded["users"][1]]
+    assert sheets["Criteria"] == []
+
+
+def test_cursor_overlaps_by_the_configured_seconds(client, seeded, monkeypatch):
+    monkeypatch.setattr(files, "EXPORT_CURSOR_OVERLAP_SECONDS", 300)
+    before = datetime.now(timezone.utc)
+    r, _ = delta(client, before.isoformat())
+    cursor = datetime.fromisoformat(r.headers["x-export-cursor"])
+    assert before - timedelta(seconds=302) < cursor < before - timedelta(seconds=298)
+
+
+def test_deleted_rows_are_exported_as_tombstones(client, seeded):
+    since = (datetime.now(timezone.utc) - timedelta(minutes=1)).isoformat()
+    role_id = client.post("/roles", json={"name": "guest"}).json()["id"]
+    assert client.delete(f"/roles/{role_id}").status_code == 200
+    _, sheets = delta(client, since)
+    assert [(row[1], json.loads(row[2])) for row in sheets["DeletedRows"]] == [("roles", {"id": role_id})]
+
+
+def test_delta_rejects_invalid_cursor(client, seeded):
+    assert client.get("/files/export", params={"since": "yesterday"}).status_code == 400
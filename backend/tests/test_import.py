@@ -0,0 +1,58 @@
+import io
+
+import openpyxl
+from sqlalchemy import func, select
+
+from app import models
+from app.importer import import_workbook
+
+
+def exported_workbook(client, tmp_path, edit):
+    """Export the data, apply edit(workbook) and save it as an import file."""
+    workbook = openpyxl.load_workbook(io.BytesIO(client.get("/files/export").content))
+    edit(workbook)
+    path = tmp_path / "import.xlsx"
+    workbook.save(path)
+    return str(path)
+
+
+def rename_and_add_user(workbook):
+    users = workbook["Users"]
+    header = [cell.value for cell in users[1]]
+    users.cell(row=3, column=header.index("first_name") + 1, value="Renamed")
+    new = list(next(users.iter_rows(min_row=2, max_row=2, values_only=True)))
+    new[header.index("id")] = 100
+    new[header.index("email")] = "new@example.com"
+    users.append(new)
+
+
+def test_dry_run_counts_changes_without_writing(client, seeded, session, tmp_path):
+    path = exported_workbook(client, tmp_path, rename_and_add_user)
+
+    stats = import_workbook(session, path, dry_run=True)
+    users = stats["Users"]
+    assert (users["rows"], users["inserted"], users["updated"], users["unchanged"]) == (4, 1, 1, 2)
+    assert [row["first_name"] for row in users["samples"]["update"]] == ["Renamed"]
+    assert [row["email"] for row in users["samples"]["insert"]] == ["new@example.com"]
+    assert stats["Criteria"]["unchanged"] == 3
+
+    session.rollback()
+    assert session.scalar(select(func.count()).select_from(models.User)) == 3
+    assert session.get(models.User, seeded["users"][1]).first_name == "First1"
+
+
+def test_import_applies_what_the_dry_run_reported(client, seeded, session, tmp_path):
+    path = exported_workbook(client, tmp_path, rename_and_add_user)
+    dry = import_workbook(session, path, dry_run=True)
+    session.rollback()
+
+    stats = import_workbook(session, path)
+    assert {k: stats["Users"][k] for k in ("inserted", "updated")} == {k: dry["Users"][k] for k in ("inserted", "updated")}
+    assert session.get(models.User, seeded["users"][1]).first_name == "Renamed"
+    assert session.scalar(select(func.count()).select_from(models.User)) == 4
+
+
+def test_unchanged_workbook_is_a_no_op(client, seeded, session, tmp_path):
+    path = exported_workbook(client, tmp_path, lambda workbook: None)
+    stats = import_workbook(session, path, dry_run=True)
+    assert all(sheet["inserted"] == sheet["updated"] == 0 for sheet in stats.values())
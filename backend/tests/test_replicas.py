@@ -0,0 +1,94 @@
+import asyncio
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import create_async_engine
+from starlette.requests import Request
+
+from app import db
+from app.db import ReplicaSet
+
+
+def replica_set(engines, check_timeout=1.0):
+    return ReplicaSet(engines, check_interval=10, retry_interval=30, check_timeout=check_timeout)
+
+
+def healthy_engine(tmp_path, name):
+    return create_engine(f"sqlite:///{tmp_path / name}")
+
+
+def broken_engine(tmp_path):
+    return create_engine(f"sqlite:///{tmp_path / 'missing' / 'replica.db'}")
+
+
+def request(cookies=""):
+    return Request({"type": "http", "method": "GET", "headers": [(b"cookie", cookies.encode())]})
+
+
+def test_healthy_replicas_are_used_round_robin(tmp_path):
+    engines = [healthy_engine(tmp_path, "a.db"), healthy_engine(tmp_path, "b.db")]
+    replicas = replica_set(engines)
+    assert {replicas.pick() for _ in range(4)} == set(engines)
+
+
+def test_failed_replicas_are_skipped_until_the_retry_interval(tmp_path, monkeypatch):
+    healthy, broken = healthy_engine(tmp_path, "a.db"), broken_engine(tmp_path)
+    replicas = replica_set([broken, healthy])
+    pings = []
+    ping = replicas._ping
+    monkeypatch.setattr(replicas, "_ping", lambda index: (pings.append(index), ping(index)))
+
+    assert [replicas.pick() for _ in range(4)] == [healthy] * 4
+    assert sorted(pings) == [0, 1]
+
+
+def test_no_healthy_replica_falls_back_to_the_primary(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "replicas", replica_set([broken_engine(tmp_path)]))
+    provider = db.get_read_db(request())
+    session = next(provider)
+    assert session.get_bind() is db.engine
+    provider.close()
+
+
+def test_recent_writers_read_from_the_primary(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "replicas", replica_set([healthy_engine(tmp_path, "a.db")]))
+    provider = db.get_read_db(request(f"{db.PRIMARY_COOKIE}={time.time() + 60}"))
+    assert next(provider).get_bind() is db.engine
+    provider.close()
+
+    provider = db.get_read_db(request())
+    assert next(provider).get_bind() is db.replicas.engines[0]
+    provider.close()
+
+
+def test_hanging_health_check_times_out(tmp_path, monkeypatch):
+    replicas = replica_set([healthy_engine(tmp_path, "a.db")], check_timeout=0.1)
+    monkeypatch.setattr(replicas, "_ping", lambda index: time.sleep(1))
+    start = time.monotonic()
+    assert replicas.pick() is None
+    assert time.monotonic() - start < 0.5
+
+
+def test_hanging_async_health_check_times_out(tmp_path, monkeypatch):
+    replicas = replica_set([create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'a.db'}")], check_timeout=0.1)
+
+    async def hang(index):
+        await asyncio.sleep(1)
+
+    monkeypatch.setattr(replicas, "_ping_async", hang)
+    start = time.monotonic()
+    assert asyncio.run(replicas.pick_async()) is None
+    assert time.monotonic() - start < 0.5
+
+
+def test_async_replica_is_picked_when_healthy(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'a.db'}")
+    replicas = replica_set([engine])
+
+    async def pick():
+        try:
+            return await replicas.pick_async()
+        finally:
+            await engine.dispose()
+
+    assert asyncio.run(pick()) is engine
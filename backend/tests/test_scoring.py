@@ -0,0 +1,63 @@
+from sqlalchemy import delete
+
+from app import models
+
+
+def assign_roles(session, seeded, roles):
+    session.add_all([
+        models.UserSessionRole(user_id=seeded["users"][user], session_id=seeded["session"], role_id=role_id)
+        for user, role_id in roles.items()
+    ])
+    session.commit()
+
+
+def evaluate(client, seeded):
+    r = client.post("/criteria/batch", json={"operations": [
+        op
+        for user in seeded["users"]
+        for op in [
+            {
+                "user_id": user, "criterion_id": seeded["criteria"]["points"],
+                "session_id": seeded["session"], "action": "increment", "delta": 3
+            },
+            {
+                "user_id": user, "criterion_id": seeded["criteria"]["present"],
+                "session_id": seeded["session"], "action": "set_boolean", "value": True
+            },
+        ]
+    ]})
+    assert r.status_code == 200, r.text
+
+
+def test_scores_use_role_weights_and_default_to_one(client, seeded, session):
+    # User 0 weighs points 2, user 1 has no weight for present, user 2 has no role
+    assign_roles(session, seeded, {0: 1, 1: 2})
+    evaluate(client, seeded)
+
+    r = client.get(f"/sessions/{seeded['session']}/scores")
+    assert r.status_code == 200
+    scores = {s["user_id"]: s["score"] for s in r.json()}
+    assert scores == {seeded["users"][0]: 7.0, seeded["users"][1]: 4.0, seeded["users"][2]: 4.0}
+
+
+def test_scores_match_effective_weights(client, seeded, session):
+    assign_roles(session, seeded, {0: 1, 1: 2})
+    r = client.get(f"/roles/session/{seeded['session']}/weights", params={"user_ids": seeded["users"]})
+    points, present = str(seeded["criteria"]["points"]), str(seeded["criteria"]["present"])
+    weights = r.json()
+    assert [weights[str(u)][points] for u in seeded["users"]] == [2.0, 1.0, 1.0]
+    assert [weights[str(u)][present] for u in seeded["users"]] == [1.0, 1.0, 1.0]
+
+
+def test_scores_without_matching_session_criteria_are_empty(client, seeded, session):
+    evaluate(client, seeded)
+    session.execute(delete(models.SessionCriterion).where(models.SessionCriterion.session_id == seeded["session"]))
+    session.commit()
+
+    r = client.get(f"/sessions/{seeded['session']}/scores")
+    assert r.status_code == 200
+    assert r.json() == []
+
+
+def test_scores_of_unknown_session(client, seeded):
+    assert client.get("/sessions/999/scores").status_code == 404
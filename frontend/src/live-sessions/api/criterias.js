@@ -48,6 +48,16 @@ export const setBooleanValue = (criterionId, userId, sessionId, value) =>
 export const setTextValue = (criterionId, userId, sessionId, value) =>
   updateUserCriterion(criterionId, userId, sessionId, "set_text", value);
 
+// ----- Batch Update Endpoint -----
+/**
+ * Apply many user criterion updates in one request.
+ * @param {Array<{criterion_id: number, user_id: number, session_id: number,
+ *   action: 'increment'|'decrement'|'set_boolean'|'set_text', delta?: number,
+ *   value?: boolean|string}>} operations
+ */
+export const batchUpdateUserCriteria = (operations) =>
+  axios.post(`${API_URL}/batch`, { operations });
+
 /**
  * Get all user criteria entries for a specific criterion (optionally filtered by session)
  * @param {number} criterionId 
@@ -7,8 +7,13 @@ const FILES_URL = `${API_BASE}/files`;
 export const exportUsersXLSX = () =>
   axios.get(`${FILES_URL}/export`, { responseType: "blob" });
 
-// Import XLSX
-export const importUsersXLSX = (formData) =>
+// Import XLSX (runs as a background job; dryRun only reports the changes)
+export const importUsersXLSX = (formData, dryRun = false) =>
   axios.post(`${FILES_URL}/import`, formData, {
     headers: { "Content-Type": "multipart/form-data" },
+    params: { dry_run: dryRun },
   });
+
+// Import job status
+export const getImportJob = (jobId) =>
+  axios.get(`${FILES_URL}/import/${jobId}`);